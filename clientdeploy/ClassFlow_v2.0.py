@@ -2,6 +2,9 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 import sqlite3
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
 import json
 import os
 import calendar
@@ -12,10 +15,12 @@ import urllib.error
 import base64
 import hashlib
 import threading
+import queue
 import zipfile
 import shutil
 import subprocess
 import sys
+import time
 
 # Lazy imports - load only when needed
 def lazy_import_pandas():
@@ -327,7 +332,1824 @@ class LicenseManager:
         
         return violations, config
 
+class NameTable:
+    """Interns names as small integer IDs; ID 0 is always the blank name"""
+
+    def __init__(self):
+        self.names = ['']
+        self.ids = {'': 0}
+        self._normalized = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        """Return the ID for a name, adding it to the table if needed"""
+        name = name or ''
+        name_id = self.ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self.ids[name] = name_id
+        return name_id
+
+    def copy(self):
+        table = NameTable()
+        table.names = self.names[:]
+        table.ids = dict(self.ids)
+        return table
+
+    def normalized(self):
+        """Case-insensitive form of every name, indexed by ID"""
+        if len(self._normalized) != len(self.names):
+            self._normalized = [name.strip().lower() for name in self.names]
+        return self._normalized
+
+class TeacherDirectory:
+    """Sorted, prefix-indexed teacher list shared by every cell's teacher picker"""
+
+    LIMIT = 100
+
+    def __init__(self, teachers=(), teacher_subjects=None):
+        self.update(teachers, teacher_subjects)
+
+    def update(self, teachers, teacher_subjects=None):
+        self._entries = sorted((name.casefold(), name) for name in set(teachers) if name)
+        self._keys = [key for key, _ in self._entries]
+        self._subjects = {teacher: set(subjects) for teacher, subjects in (teacher_subjects or {}).items()}
+
+    def __contains__(self, name):
+        key = name.casefold()
+        i = bisect_left(self._keys, key)
+        return i < len(self._keys) and self._keys[i] == key
+
+    def can_teach(self, teacher, subject):
+        """False only when the teacher has a subject mapping that leaves subject out"""
+        subjects = self._subjects.get(teacher)
+        return not subjects or subject in subjects
+
+    def matches(self, prefix='', subject='', limit=LIMIT):
+        """Teachers whose name starts with prefix, those mapped to subject first"""
+        key = prefix.strip().casefold()
+        start = bisect_left(self._keys, key)
+        end = bisect_left(self._keys, key + '\uffff')
+        names = [name for _, name in self._entries[start:end]]
+        if subject:
+            # Stable sort keeps the alphabetical order within each group
+            names.sort(key=lambda name: subject not in self._subjects.get(name, ()))
+        return names[:limit]
+
+class TimetableModel:
+    """Tk-independent timetable store behind the grid.
+
+    Cells are laid out densely and row-major over (class, section) rows and
+    (day, period) columns. Each cell holds an interned subject ID and teacher
+    ID in two flat integer arrays, so full-grid scans run at native speed
+    instead of reading widget variables one by one.
+    """
+
+    def __init__(self, config):
+        self._listeners = []
+        self.configure(config)
+
+    @staticmethod
+    def axes_for(config):
+        """Return the (rows, cols) axes described by a config"""
+        rows = [(class_, section) for class_ in config['classes'] for section in config['sections']]
+        cols = [(day, period) for day in config['days'] for period in range(config['periods_per_day'])]
+        return rows, cols
+
+    def configure(self, config):
+        """Rebuild the row/column axes from config and clear every cell"""
+        self.subjects = NameTable()
+        self.teachers = NameTable()
+        self._set_axes(*self.axes_for(config))
+        self.subject_ids = array('i', bytes(4 * len(self.rows) * self.ncols))
+        self.teacher_ids = array('i', bytes(4 * len(self.rows) * self.ncols))
+        self._notify(None)
+
+    def reshape(self, config):
+        """Change the axes to match config, keeping the values of surviving cells.
+
+        Returns a dict listing the rows and columns that were added or removed.
+        """
+        rows, cols = self.axes_for(config)
+        row_set, col_set = set(rows), set(cols)
+        diff = {
+            'rows_added': [row for row in rows if row not in self.row_index],
+            'rows_removed': [row for row in self.rows if row not in row_set],
+            'cols_added': [col for col in cols if col not in self.col_index],
+            'cols_removed': [col for col in self.cols if col not in col_set],
+        }
+        if rows == self.rows and cols == self.cols:
+            return diff
+
+        old_ncols, old_row_index, old_col_index = self.ncols, self.row_index, self.col_index
+        old_subjects, old_teachers = self.subject_ids, self.teacher_ids
+        subject_ids = array('i', bytes(4 * len(rows) * len(cols)))
+        teacher_ids = array('i', bytes(4 * len(rows) * len(cols)))
+        ncols = len(cols)
+        col_map = [(new_col, old_col_index[col]) for new_col, col in enumerate(cols) if col in old_col_index]
+        same_cols = cols == self.cols
+        for new_row, row in enumerate(rows):
+            old_row = old_row_index.get(row)
+            if old_row is None:
+                continue
+            old_base, new_base = old_row * old_ncols, new_row * ncols
+            if same_cols:
+                # Whole row survives unchanged, copy it as one slice
+                subject_ids[new_base:new_base + ncols] = old_subjects[old_base:old_base + old_ncols]
+                teacher_ids[new_base:new_base + ncols] = old_teachers[old_base:old_base + old_ncols]
+            else:
+                for new_col, old_col in col_map:
+                    subject_ids[new_base + new_col] = old_subjects[old_base + old_col]
+                    teacher_ids[new_base + new_col] = old_teachers[old_base + old_col]
+
+        self._set_axes(rows, cols)
+        self.subject_ids, self.teacher_ids = subject_ids, teacher_ids
+        self._notify(None)
+        return diff
+
+    def _set_axes(self, rows, cols):
+        self.rows = rows
+        self.cols = cols
+        self.row_index = {row: i for i, row in enumerate(rows)}
+        self.col_index = {col: i for i, col in enumerate(cols)}
+        self.ncols = len(cols)
+
+    def __len__(self):
+        return len(self.subject_ids)
+
+    def __contains__(self, key):
+        return key[:2] in self.row_index and key[2:] in self.col_index
+
+    def index(self, key):
+        """Flat cell index for a (class, section, day, period) key, or None"""
+        row = self.row_index.get(key[:2])
+        col = self.col_index.get(key[2:])
+        if row is None or col is None:
+            return None
+        return row * self.ncols + col
+
+    def key_at(self, index):
+        row, col = divmod(index, self.ncols)
+        return self.rows[row] + self.cols[col]
+
+    def keys(self):
+        """Yield every (class, section, day, period) key in grid order"""
+        for class_, section in self.rows:
+            for day, period in self.cols:
+                yield (class_, section, day, period)
+
+    def get(self, key):
+        """Return the (subject, teacher) names stored for a cell"""
+        index = self.index(key)
+        if index is None:
+            return '', ''
+        return self.get_at(index)
+
+    def get_at(self, index):
+        return self.subjects.names[self.subject_ids[index]], self.teachers.names[self.teacher_ids[index]]
+
+    def set(self, key, subject=None, teacher=None):
+        """Update one cell; fields passed as None are left unchanged"""
+        self.assign([(key, subject, teacher)])
+
+    def assign(self, items):
+        """Update many (key, subject, teacher) cells with a single notification.
+
+        Returns the number of items whose key exists in the model.
+        """
+        changes = []
+        found = 0
+        for key, subject, teacher in items:
+            index = self.index(key)
+            if index is None:
+                continue
+            found += 1
+            old_sid, old_tid = self.subject_ids[index], self.teacher_ids[index]
+            sid = old_sid if subject is None else self.subjects.intern(subject)
+            tid = old_tid if teacher is None else self.teachers.intern(teacher)
+            if (sid, tid) != (old_sid, old_tid):
+                self.subject_ids[index] = sid
+                self.teacher_ids[index] = tid
+                changes.append((index, old_sid, old_tid))
+        if changes:
+            self._notify(changes)
+        return found
+
+    def replace(self, state):
+        """Swap in a decoded WeekState with a single reset notification.
+
+        Returns False if the state was decoded for different axes.
+        """
+        if state.rows != self.rows or state.cols != self.cols:
+            return False
+        self.subjects, self.teachers = state.subjects, state.teachers
+        self.subject_ids, self.teacher_ids = state.subject_ids, state.teacher_ids
+        self._notify(None)
+        return True
+
+    def filled(self):
+        """Yield (key, subject, teacher) for every cell holding a subject or teacher"""
+        subjects, teachers = self.subjects.names, self.teachers.names
+        for index, (sid, tid) in enumerate(zip(self.subject_ids, self.teacher_ids)):
+            if sid or tid:
+                yield self.key_at(index), subjects[sid], teachers[tid]
+
+    def add_listener(self, callback):
+        """Register callback(changes) for cell edits.
+
+        changes is a list of (index, old_subject_id, old_teacher_id) tuples, or
+        None after a reset that replaced the axes or every cell at once.
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, changes):
+        for callback in self._listeners:
+            callback(changes)
+
+class TimetableIndex:
+    """Lookup indexes over a TimetableModel, kept current from its notifications.
+
+    rows_by_class, rows_by_section and cols_by_day map a class, section or day
+    to its model row or column indices; the teacher and subject indexes map a
+    normalized name to the set of flat cell indices holding it. An occupancy
+    count per (teacher, column) answers double-booking questions in constant
+    time. Edits update the indexes per cell, resets rebuild them in one pass.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.rebuild()
+        model.add_listener(self._on_change)
+
+    def rebuild(self):
+        model = self.model
+        self.rows_by_class = {}
+        self.rows_by_section = {}
+        for row, (class_, section) in enumerate(model.rows):
+            self.rows_by_class.setdefault(class_, []).append(row)
+            self.rows_by_section.setdefault(section, []).append(row)
+        self.cols_by_day = {}
+        for col, (day, _) in enumerate(model.cols):
+            self.cols_by_day.setdefault(day, []).append(col)
+        self._by_teacher = self._name_index(model.teachers, model.teacher_ids)
+        self._by_subject = self._name_index(model.subjects, model.subject_ids)
+        ncols = model.ncols
+        self._occupancy = {}
+        for teacher, cells in self._by_teacher.items():
+            for index in cells:
+                slot = (teacher, index % ncols)
+                self._occupancy[slot] = self._occupancy.get(slot, 0) + 1
+
+    @staticmethod
+    def _name_index(table, ids):
+        names = table.normalized()
+        by_name = {}
+        for index, name_id in enumerate(ids):
+            if name_id:
+                by_name.setdefault(names[name_id], set()).add(index)
+        return by_name
+
+    def teacher_cells(self, teacher):
+        """Flat indices of the cells held by a teacher (case-insensitive)"""
+        return self._by_teacher.get(teacher.strip().lower(), set())
+
+    def teacher_cells_on(self, teacher, day):
+        """A teacher's cells on one day, in grid order"""
+        ncols = self.model.ncols
+        day_cols = set(self.cols_by_day.get(day, ()))
+        return sorted(index for index in self.teacher_cells(teacher) if index % ncols in day_cols)
+
+    def teacher_schedule(self, teacher):
+        """A teacher's week as (day, period, class, section, subject), in day/period order"""
+        model = self.model
+        ncols = model.ncols
+        subjects = model.subjects.names
+        schedule = []
+        for index in sorted(self.teacher_cells(teacher), key=lambda i: (i % ncols, i // ncols)):
+            class_, section = model.rows[index // ncols]
+            day, period = model.cols[index % ncols]
+            schedule.append((day, period, class_, section, subjects[model.subject_ids[index]]))
+        return schedule
+
+    def teachers(self):
+        """Yield (normalized teacher name, cell indices) for every teacher holding a cell"""
+        return iter(self._by_teacher.items())
+
+    def search(self, query):
+        """Cells whose teacher, subject, class or section starts with query (case-insensitive)"""
+        query = query.strip().lower()
+        if not query:
+            return set()
+        hits = set()
+        # Prefix matching walks the distinct names, never the cells
+        for by_name in (self._by_teacher, self._by_subject):
+            for name, cells in by_name.items():
+                if name.startswith(query):
+                    hits |= cells
+        ncols = self.model.ncols
+        for by_label in (self.rows_by_class, self.rows_by_section):
+            for label, rows in by_label.items():
+                if label.lower().startswith(query):
+                    for row in rows:
+                        hits.update(range(row * ncols, (row + 1) * ncols))
+        return hits
+
+    def clashes_after_swap(self, a, b):
+        """(teacher, column) pairs that would be double-booked if cells a and b
+        swapped teachers, from the occupancy counts alone"""
+        ncols = self.model.ncols
+        col_a, col_b = a % ncols, b % ncols
+        if col_a == col_b:
+            return []
+        names = self.model.teachers.normalized()
+        teacher_a = names[self.model.teacher_ids[a]]
+        teacher_b = names[self.model.teacher_ids[b]]
+        if teacher_a == teacher_b:
+            return []
+        # Each teacher leaves their own column and joins the other one
+        clashes = []
+        if teacher_a and self._occupancy.get((teacher_a, col_b)):
+            clashes.append((teacher_a, col_b))
+        if teacher_b and self._occupancy.get((teacher_b, col_a)):
+            clashes.append((teacher_b, col_a))
+        return clashes
+
+    def teacher_view(self, teacher):
+        """Sorted model rows and columns that contain any of a teacher's cells"""
+        ncols = self.model.ncols
+        cells = self.teacher_cells(teacher)
+        return sorted({index // ncols for index in cells}), sorted({index % ncols for index in cells})
+
+    def _on_change(self, changes):
+        if changes is None:
+            self.rebuild()
+            return
+        model = self.model
+        teacher_names = model.teachers.normalized()
+        subject_names = model.subjects.normalized()
+        occupancy = self._occupancy
+        ncols = model.ncols
+        # A cell written twice in one batch is compared against its first old value
+        first = {}
+        for index, old_sid, old_tid in changes:
+            first.setdefault(index, (old_sid, old_tid))
+        for index, (old_sid, old_tid) in first.items():
+            new_tid = model.teacher_ids[index]
+            self._move(self._by_teacher, teacher_names, index, old_tid, new_tid)
+            self._move(self._by_subject, subject_names, index, old_sid, model.subject_ids[index])
+            if new_tid != old_tid:
+                col = index % ncols
+                if old_tid:
+                    slot = (teacher_names[old_tid], col)
+                    if occupancy.get(slot, 0) > 1:
+                        occupancy[slot] -= 1
+                    else:
+                        occupancy.pop(slot, None)
+                if new_tid:
+                    slot = (teacher_names[new_tid], col)
+                    occupancy[slot] = occupancy.get(slot, 0) + 1
+
+    @staticmethod
+    def _move(by_name, names, index, old_id, new_id):
+        if new_id == old_id:
+            return
+        if old_id:
+            cells = by_name.get(names[old_id])
+            if cells is not None:
+                cells.discard(index)
+                if not cells:
+                    del by_name[names[old_id]]
+        if new_id:
+            by_name.setdefault(names[new_id], set()).add(index)
+
+class WeekState:
+    """Cell arrays for one saved week, decoded without touching Tk.
+
+    Built on a worker thread from timetable rows, then swapped into the
+    model on the Tk thread with TimetableModel.replace.
+    """
+    __slots__ = ('rows', 'cols', 'subjects', 'teachers', 'subject_ids', 'teacher_ids', 'count', 'template')
+
+    def __init__(self, rows, cols, records, template=False):
+        self.rows = rows
+        self.cols = cols
+        self.template = template
+        self.subjects = NameTable()
+        self.teachers = NameTable()
+        self.subject_ids = array('i', bytes(4 * len(rows) * len(cols)))
+        self.teacher_ids = array('i', bytes(4 * len(rows) * len(cols)))
+        self.count = 0
+
+        row_index = {row: i for i, row in enumerate(rows)}
+        col_index = {col: i for i, col in enumerate(cols)}
+        ncols = len(cols)
+        for class_, section, day, period, subject, teacher in records:
+            row = row_index.get((class_, section))
+            col = col_index.get((day, period))
+            if row is None or col is None:
+                continue
+            index = row * ncols + col
+            self.subject_ids[index] = self.subjects.intern(subject)
+            self.teacher_ids[index] = self.teachers.intern(teacher)
+            self.count += 1
+
+    def copy(self):
+        """An independent copy; TimetableModel.replace takes ownership of the one it is given"""
+        clone = WeekState.__new__(WeekState)
+        clone.rows, clone.cols, clone.template, clone.count = self.rows, self.cols, self.template, self.count
+        clone.subjects, clone.teachers = self.subjects.copy(), self.teachers.copy()
+        clone.subject_ids, clone.teacher_ids = self.subject_ids[:], self.teacher_ids[:]
+        return clone
+
+
+class WeekCache:
+    """Least-recently-used decoded weeks keyed by (year, week), shared with worker threads.
+
+    The cap is on bytes held in cell arrays rather than on entries, so a
+    large school keeps fewer weeks. Entries are handed out as copies so
+    the model can edit what it loads. Every invalidation bumps version,
+    and put() drops a week fetched before the latest one.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.version = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(state):
+        return (len(state.subject_ids) + len(state.teacher_ids)) * state.subject_ids.itemsize
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key, rows, cols):
+        """A copy of the cached week if it was decoded for these axes, else None"""
+        with self._lock:
+            state = self._entries.get(key)
+            if state is None or state.rows != rows or state.cols != cols:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return state.copy()
+
+    def put(self, key, state, version):
+        """Cache a state no one else holds, unless the cache was invalidated since version"""
+        with self._lock:
+            if version != self.version:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old)
+            self._entries[key] = state
+            self._bytes += self._size(state)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+
+    def invalidate(self, key=None):
+        """Forget one week, or every week when key is None"""
+        with self._lock:
+            self.version += 1
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= self._size(old)
+
+class TimetableStore:
+    """Repository for saved timetables in the SQLite database.
+
+    Owns the writer connection and the schema migrations, and exposes
+    batched operations that each run as a single transaction. Every
+    operation uses fixed statement text, so the connection's statement
+    cache prepares each one only once. Reads, which may run on any
+    thread, borrow a read-only connection from a small pool; under WAL
+    they see the last commit and neither block nor wait for the writer.
+
+    A week is stored either in full or as overrides on the base template
+    (week_meta.template). In a template week a timetable row replaces the
+    template cell, and a row with neither subject nor teacher clears it.
+    """
+
+    SCHEMA_VERSION = 5
+    STATEMENT_CACHE = 64
+    READER_POOL = 4
+
+    # Both take names, which are resolved to lookup IDs; see _store_names
+    UPSERT_CELL = '''
+        INSERT INTO timetable (year, week, class_id, section_id, day, period, subject_id, teacher_id)
+        VALUES (?, ?, (SELECT id FROM classes WHERE name=?), (SELECT id FROM sections WHERE name=?), ?, ?,
+                (SELECT id FROM subjects WHERE name=?), (SELECT id FROM teachers WHERE name=?))
+        ON CONFLICT (year, week, class_id, section_id, day, period) DO UPDATE
+        SET subject_id=excluded.subject_id, teacher_id=excluded.teacher_id
+        WHERE subject_id IS NOT excluded.subject_id OR teacher_id IS NOT excluded.teacher_id
+    '''
+    DELETE_CELL = '''
+        DELETE FROM timetable
+        WHERE year=? AND week=?
+          AND class_id=(SELECT id FROM classes WHERE name=?)
+          AND section_id=(SELECT id FROM sections WHERE name=?)
+          AND day=? AND period=?
+    '''
+    # Stored cells of the week, then the template cells it does not override
+    WEEK_CELLS = '''
+        SELECT class, section, day, period, subject, teacher
+        FROM timetable_names
+        WHERE year=:year AND week=:week AND (subject IS NOT NULL OR teacher IS NOT NULL)
+        UNION ALL
+        SELECT t.class, t.section, t.day, t.period, t.subject, t.teacher
+        FROM template_names t
+        JOIN week_meta m ON m.year=:year AND m.week=:week AND m.template
+        WHERE NOT EXISTS (
+            SELECT 1 FROM timetable o
+            WHERE o.year=:year AND o.week=:week AND o.class_id=t.class_id
+              AND o.section_id=t.section_id AND o.day=t.day AND o.period=t.period)
+    '''
+    WEEK_KEYS = "SELECT class, section, day, period FROM timetable_names WHERE year=? AND week=?"
+    WEEK_TEMPLATE = "SELECT template FROM week_meta WHERE year=? AND week=?"
+    SET_WEEK_TEMPLATE = '''
+        INSERT INTO week_meta (year, week, template) VALUES (?, ?, ?)
+        ON CONFLICT (year, week) DO UPDATE SET template=excluded.template
+    '''
+    TEMPLATE_CELLS = "SELECT class, section, day, period, subject, teacher FROM template_names"
+    INSERT_TEMPLATE_CELL = '''
+        INSERT INTO template (class_id, section_id, day, period, subject_id, teacher_id)
+        VALUES ((SELECT id FROM classes WHERE name=?), (SELECT id FROM sections WHERE name=?), ?, ?,
+                (SELECT id FROM subjects WHERE name=?), (SELECT id FROM teachers WHERE name=?))
+    '''
+    APPEND_JOURNAL = '''
+        INSERT INTO edit_journal (year, week, class, section, day, period, subject, teacher)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    COPY_WEEK = '''
+        INSERT INTO timetable (year, week, class_id, section_id, day, period, subject_id, teacher_id)
+        SELECT ?, ?, class_id, section_id, day, period, subject_id, teacher_id
+        FROM timetable WHERE year=? AND week=?
+    '''
+    COPY_WEEK_META = '''
+        INSERT INTO week_meta (year, week, template)
+        SELECT ?, ?, template FROM week_meta WHERE year=? AND week=?
+    '''
+    COUNT_MATCHES = '''
+        SELECT year, week, SUM(cells) FROM (
+            SELECT year, week, COUNT(*) AS cells
+            FROM timetable
+            WHERE (teacher_id IN (SELECT id FROM teachers WHERE name LIKE :pattern ESCAPE '\\')
+                   OR subject_id IN (SELECT id FROM subjects WHERE name LIKE :pattern ESCAPE '\\')
+                   OR class_id IN (SELECT id FROM classes WHERE name LIKE :pattern ESCAPE '\\')
+                   OR section_id IN (SELECT id FROM sections WHERE name LIKE :pattern ESCAPE '\\'))
+              AND (subject_id IS NOT NULL OR teacher_id IS NOT NULL)
+            GROUP BY year, week
+            UNION ALL
+            SELECT m.year, m.week, COUNT(*)
+            FROM week_meta m JOIN template t
+            WHERE m.template
+              AND (t.teacher_id IN (SELECT id FROM teachers WHERE name LIKE :pattern ESCAPE '\\')
+                   OR t.subject_id IN (SELECT id FROM subjects WHERE name LIKE :pattern ESCAPE '\\')
+                   OR t.class_id IN (SELECT id FROM classes WHERE name LIKE :pattern ESCAPE '\\')
+                   OR t.section_id IN (SELECT id FROM sections WHERE name LIKE :pattern ESCAPE '\\'))
+              AND NOT EXISTS (
+                  SELECT 1 FROM timetable o
+                  WHERE o.year=m.year AND o.week=m.week AND o.class_id=t.class_id
+                    AND o.section_id=t.section_id AND o.day=t.day AND o.period=t.period)
+            GROUP BY m.year, m.week
+        )
+        GROUP BY year, week
+        ORDER BY year, week
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False, cached_statements=self.STATEMENT_CACHE)
+        self.conn.execute('PRAGMA journal_mode=WAL')  # Faster writes
+        self.conn.execute('PRAGMA synchronous=NORMAL')  # Better performance
+        # Writes may come from the writer thread and the Tk thread; one transaction at a time
+        self._lock = threading.Lock()
+        self._template = None
+        self._migrate()
+        self._readers = queue.LifoQueue()
+        self._reader_slots = threading.Semaphore(self.READER_POOL)
+
+    def _in_transaction(self, work):
+        """Run work(cursor) as one transaction and return its result"""
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute('BEGIN')
+            try:
+                result = work(cursor)
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            return result
+
+    def _migrate(self):
+        # Step N upgrades a version N-1 database; PRAGMA user_version records the last step applied
+        migrations = [self._migrate_to_cell_keys, self._migrate_to_lookup_tables, self._migrate_to_week_templates,
+                      self._migrate_to_edit_journal, self._drop_class_section_indexes]
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        for step in range(version, self.SCHEMA_VERSION):
+            # Each step is one transaction, so an interrupted upgrade resumes where it stopped
+            def upgrade(cursor, step=step):
+                migrations[step](cursor)
+                cursor.execute(f'PRAGMA user_version = {step + 1}')
+            self._in_transaction(upgrade)
+
+    def _migrate_to_cell_keys(self, cursor):
+        """Version 1: one text row per cell, keyed by (year, week, class, section, day, period).
+
+        Legacy tables were keyed by an autoincrement id. Duplicate rows for a
+        cell collapse to the most recently inserted one; rows without a year
+        or week were never loadable and are dropped.
+        """
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(timetable)').fetchall()]
+        if columns:
+            cursor.execute('ALTER TABLE timetable RENAME TO timetable_legacy')
+        cursor.execute('''CREATE TABLE timetable (
+            year INTEGER NOT NULL,
+            week INTEGER NOT NULL,
+            class TEXT NOT NULL,
+            section TEXT NOT NULL,
+            day TEXT NOT NULL,
+            period INTEGER NOT NULL,
+            subject TEXT,
+            teacher TEXT,
+            PRIMARY KEY (year, week, class, section, day, period)
+        ) WITHOUT ROWID''')
+        if {'year', 'week'} <= set(columns):
+            order = 'ORDER BY id' if 'id' in columns else ''
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO timetable (year, week, class, section, day, period, subject, teacher)
+                SELECT year, week, class, section, day, period, subject, teacher
+                FROM timetable_legacy
+                WHERE year IS NOT NULL AND week IS NOT NULL AND class IS NOT NULL
+                  AND section IS NOT NULL AND day IS NOT NULL AND period IS NOT NULL
+                {order}
+            ''')
+        if columns:
+            cursor.execute('DROP TABLE timetable_legacy')
+
+    def _migrate_to_lookup_tables(self, cursor):
+        """Version 2: names live once in lookup tables and cells store integer IDs.
+
+        The clustered primary key is the covering index for week loads, and
+        timetable_names joins the names back for readers that want text.
+        Renaming a teacher is then one UPDATE on the teachers table.
+        """
+        lookups = (('classes', 'class'), ('sections', 'section'), ('subjects', 'subject'), ('teachers', 'teacher'))
+        for table, column in lookups:
+            cursor.execute(f'CREATE TABLE {table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+            cursor.execute(f"INSERT INTO {table} (name) SELECT DISTINCT {column} FROM timetable "
+                           f"WHERE {column} IS NOT NULL AND {column} != ''")
+
+        cursor.execute('ALTER TABLE timetable RENAME TO timetable_text')
+        cursor.execute('''CREATE TABLE timetable (
+            year INTEGER NOT NULL,
+            week INTEGER NOT NULL,
+            class_id INTEGER NOT NULL REFERENCES classes(id),
+            section_id INTEGER NOT NULL REFERENCES sections(id),
+            day TEXT NOT NULL,
+            period INTEGER NOT NULL,
+            subject_id INTEGER REFERENCES subjects(id),
+            teacher_id INTEGER REFERENCES teachers(id),
+            PRIMARY KEY (year, week, class_id, section_id, day, period)
+        ) WITHOUT ROWID''')
+        cursor.execute('''
+            INSERT INTO timetable (year, week, class_id, section_id, day, period, subject_id, teacher_id)
+            SELECT t.year, t.week, c.id, s.id, t.day, t.period, sub.id, te.id
+            FROM timetable_text t
+            JOIN classes c ON c.name = t.class
+            JOIN sections s ON s.name = t.section
+            LEFT JOIN subjects sub ON sub.name = t.subject
+            LEFT JOIN teachers te ON te.name = t.teacher
+        ''')
+        cursor.execute('DROP TABLE timetable_text')
+
+        # Renames and searches look cells up by teacher or subject ID. Class and
+        # section have few distinct values and are reached through the primary key,
+        # so they get no index of their own for every write to maintain.
+        for column in ('subject_id', 'teacher_id'):
+            cursor.execute(f'CREATE INDEX idx_timetable_{column} ON timetable({column})')
+        cursor.execute('''CREATE VIEW timetable_names AS
+            SELECT t.year, t.week, c.name AS class, s.name AS section, t.day, t.period,
+                   sub.name AS subject, te.name AS teacher
+            FROM timetable t
+            JOIN classes c ON c.id = t.class_id
+            JOIN sections s ON s.id = t.section_id
+            LEFT JOIN subjects sub ON sub.id = t.subject_id
+            LEFT JOIN teachers te ON te.id = t.teacher_id
+        ''')
+
+    def _migrate_to_week_templates(self, cursor):
+        """Version 3: a base template that weeks can store overrides against.
+
+        Weeks saved before this step have no week_meta row and stay full copies.
+        """
+        cursor.execute('''CREATE TABLE template (
+            class_id INTEGER NOT NULL REFERENCES classes(id),
+            section_id INTEGER NOT NULL REFERENCES sections(id),
+            day TEXT NOT NULL,
+            period INTEGER NOT NULL,
+            subject_id INTEGER REFERENCES subjects(id),
+            teacher_id INTEGER REFERENCES teachers(id),
+            PRIMARY KEY (class_id, section_id, day, period)
+        ) WITHOUT ROWID''')
+        cursor.execute('''CREATE TABLE week_meta (
+            year INTEGER NOT NULL,
+            week INTEGER NOT NULL,
+            template INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (year, week)
+        ) WITHOUT ROWID''')
+        cursor.execute('''CREATE VIEW template_names AS
+            SELECT t.class_id, t.section_id, c.name AS class, s.name AS section, t.day, t.period,
+                   sub.name AS subject, te.name AS teacher
+            FROM template t
+            JOIN classes c ON c.id = t.class_id
+            JOIN sections s ON s.id = t.section_id
+            LEFT JOIN subjects sub ON sub.id = t.subject_id
+            LEFT JOIN teachers te ON te.id = t.teacher_id
+        ''')
+
+    def _migrate_to_edit_journal(self, cursor):
+        """Version 4: an append-only journal of grid edits that are not saved yet"""
+        cursor.execute('''CREATE TABLE edit_journal (
+            seq INTEGER PRIMARY KEY,
+            year INTEGER NOT NULL,
+            week INTEGER NOT NULL,
+            class TEXT NOT NULL,
+            section TEXT NOT NULL,
+            day TEXT NOT NULL,
+            period INTEGER NOT NULL,
+            subject TEXT,
+            teacher TEXT
+        )''')
+
+    def _drop_class_section_indexes(self, cursor):
+        """Version 5: databases migrated by an earlier version 2 also indexed class and section"""
+        cursor.execute('DROP INDEX IF EXISTS idx_timetable_class_id')
+        cursor.execute('DROP INDEX IF EXISTS idx_timetable_section_id')
+
+    def _template_cells(self, cursor):
+        """The template as {key: (subject, teacher)}, cached until it is replaced"""
+        if self._template is None:
+            self._template = {row[:4]: row[4:] for row in cursor.execute(self.TEMPLATE_CELLS).fetchall()}
+        return self._template
+
+    def save_week(self, year, week, cells, template=False):
+        """Store a whole week from (key, subject, teacher) cells.
+
+        Only cells with both a subject and a teacher count as filled. A full
+        week stores every filled cell; a template week stores just the cells
+        that differ from the template, clearing template cells it leaves
+        empty. Other stored cells of the week are deleted. Returns
+        (written, removed).
+        """
+        filled = {key: (subject, teacher) for key, subject, teacher in cells if subject and teacher}
+
+        def write(cursor):
+            if template:
+                base = self._template_cells(cursor)
+                values = {key: value for key, value in filled.items() if base.get(key) != value}
+                values.update((key, (None, None)) for key in base if key not in filled)
+            else:
+                values = filled
+            rows = [(year, week) + key + value for key, value in values.items()]
+            stale = [(year, week) + key for key in cursor.execute(self.WEEK_KEYS, (year, week)).fetchall()
+                     if key not in values]
+            cursor.executemany(self.DELETE_CELL, stale)
+            self._store_names(cursor, rows)
+            cursor.executemany(self.UPSERT_CELL, rows)
+            cursor.execute(self.SET_WEEK_TEMPLATE, (year, week, int(template)))
+            return len(rows), len(stale)
+        return self._in_transaction(write)
+
+    def save_cells(self, year, week, cells, template=False):
+        """Store only the given (key, subject, teacher) cells of a week.
+
+        Filled cells are upserted and the rest deleted; in a template week a
+        cell matching the template drops its override instead. Returns
+        (written, removed).
+        """
+        def write(cursor):
+            base = self._template_cells(cursor) if template else {}
+            upserts, deletes = [], []
+            for key, subject, teacher in cells:
+                value = (subject, teacher) if subject and teacher else None
+                if value == base.get(key):
+                    deletes.append((year, week) + key)
+                else:
+                    upserts.append((year, week) + key + (value or (None, None)))
+            cursor.executemany(self.DELETE_CELL, deletes)
+            removed = max(cursor.rowcount, 0)
+            self._store_names(cursor, upserts)
+            cursor.executemany(self.UPSERT_CELL, upserts)
+            cursor.execute(self.SET_WEEK_TEMPLATE, (year, week, int(template)))
+            return len(upserts), removed
+        return self._in_transaction(write)
+
+    def save_template(self, cells):
+        """Replace the base template with the filled (key, subject, teacher) cells"""
+        rows = [key + (subject, teacher) for key, subject, teacher in cells if subject and teacher]
+
+        def write(cursor):
+            # Dropped under the store lock, so no concurrent save can cache the old template again
+            self._template = None
+            cursor.execute('DELETE FROM template')
+            self._store_names(cursor, [(None, None) + row for row in rows])
+            cursor.executemany(self.INSERT_TEMPLATE_CELL, rows)
+            return len(rows)
+        return self._in_transaction(write)
+
+    def create_week_from_template(self, year, week):
+        """Start a week as an untouched copy of the template; False if it already has cells"""
+        def write(cursor):
+            if cursor.execute(self.WEEK_KEYS + " LIMIT 1", (year, week)).fetchone():
+                return False
+            cursor.execute(self.SET_WEEK_TEMPLATE, (year, week, 1))
+            return True
+        return self._in_transaction(write)
+
+    def roll_forward(self, year, week, targets, skip_existing=True):
+        """Copy a saved week onto each (year, week) in targets in one transaction.
+
+        Rows are copied inside SQLite with one INSERT ... SELECT per target,
+        template weeks staying template weeks. A target that already has
+        data is skipped when skip_existing is set and replaced otherwise.
+        Returns (copied, skipped) week counts, or None if the source week
+        was never saved.
+        """
+        source = (year, week)
+
+        def write(cursor):
+            if not (cursor.execute(self.WEEK_TEMPLATE, source).fetchone()
+                    or cursor.execute(self.WEEK_KEYS + " LIMIT 1", source).fetchone()):
+                return None
+            copied = skipped = 0
+            for target in targets:
+                if target == source:
+                    continue
+                if skip_existing and (cursor.execute(self.WEEK_TEMPLATE, target).fetchone()
+                                      or cursor.execute(self.WEEK_KEYS + " LIMIT 1", target).fetchone()):
+                    skipped += 1
+                    continue
+                cursor.execute("DELETE FROM timetable WHERE year=? AND week=?", target)
+                cursor.execute("DELETE FROM week_meta WHERE year=? AND week=?", target)
+                cursor.execute(self.COPY_WEEK, target + source)
+                cursor.execute(self.COPY_WEEK_META, target + source)
+                copied += 1
+            return copied, skipped
+        return self._in_transaction(write)
+
+    @staticmethod
+    def _store_names(cursor, rows):
+        """Add any class, section, subject or teacher names in rows to the lookup tables"""
+        for table, column in (('classes', 2), ('sections', 3), ('subjects', 6), ('teachers', 7)):
+            names = {(row[column],) for row in rows if row[column]}
+            cursor.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', names)
+
+    def rename_teacher(self, old, new):
+        """Rename a teacher in every saved week, merging into new if it already exists"""
+        def write(cursor):
+            self._template = None
+            target = cursor.execute("SELECT id FROM teachers WHERE name=?", (new,)).fetchone()
+            if target is None:
+                # Saved weeks refer to the teacher by ID, so only the name row changes
+                cursor.execute("UPDATE teachers SET name=? WHERE name=?", (new, old))
+            else:
+                for table in ('timetable', 'template'):
+                    cursor.execute(f'''
+                        UPDATE {table} SET teacher_id=?
+                        WHERE teacher_id=(SELECT id FROM teachers WHERE name=?)
+                    ''', (target[0], old))
+                cursor.execute("DELETE FROM teachers WHERE name=?", (old,))
+        self._in_transaction(write)
+
+    def append_journal(self, year, week, cells):
+        """Journal edited (key, subject, teacher) cells of a week in one transaction"""
+        rows = [(year, week) + key + (subject, teacher) for key, subject, teacher in cells]
+        self._in_transaction(lambda cursor: cursor.executemany(self.APPEND_JOURNAL, rows))
+        return len(rows)
+
+    def clear_journal(self):
+        self._in_transaction(lambda cursor: cursor.execute('DELETE FROM edit_journal'))
+
+    def journal(self):
+        """Journaled edits as (year, week, key, subject, teacher), oldest first"""
+        rows = self._read(lambda conn: conn.execute(
+            "SELECT year, week, class, section, day, period, subject, teacher FROM edit_journal ORDER BY seq"
+        ).fetchall())
+        return [(row[0], row[1], row[2:6], row[6], row[7]) for row in rows]
+
+    def _open_reader(self):
+        uri = 'file:' + urllib.request.pathname2url(os.path.abspath(self.path)) + '?mode=ro'
+        return sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=self.STATEMENT_CACHE)
+
+    def _read(self, work):
+        """Run work(connection) on a pooled read-only connection; safe on any thread.
+
+        Each call is one read transaction, so all of its queries see the
+        same snapshot. At most READER_POOL reads run at once.
+        """
+        with self._reader_slots:
+            try:
+                conn = self._readers.get_nowait()
+            except queue.Empty:
+                conn = self._open_reader()
+            try:
+                conn.execute('BEGIN')
+                try:
+                    return work(conn)
+                finally:
+                    conn.rollback()
+            finally:
+                self._readers.put(conn)
+
+    def close(self):
+        """Close the pooled readers and the writer connection"""
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self.conn.close()
+
+    def fetch_week(self, year, week):
+        """Return (template, rows) for a saved week.
+
+        rows are (class, section, day, period, subject, teacher) with any
+        template cells already merged in.
+        """
+        def read(conn):
+            meta = conn.execute(self.WEEK_TEMPLATE, (year, week)).fetchone()
+            rows = conn.execute(self.WEEK_CELLS, {'year': year, 'week': week}).fetchall()
+            return bool(meta and meta[0]), rows
+        return self._read(read)
+
+    def count_matches(self, query):
+        """(year, week, cells) for every saved week with a name starting with query"""
+        # Wildcards typed by the user match themselves
+        pattern = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        return self._read(lambda conn: conn.execute(self.COUNT_MATCHES, {'pattern': pattern}).fetchall())
+
+
+class TimetableWriter:
+    """Applies store writes on one background thread, in the order submitted.
+
+    Batches are snapshotted on the Tk thread and queued here, so commits
+    and WAL syncs never block the UI. Finished batches wait until the Tk
+    thread collects them with poll(), which calls each on_done there.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._jobs = queue.Queue()
+        self._finished = queue.Queue()
+        self._pending = 0  # Submitted but not yet delivered; Tk thread only
+        self._thread = threading.Thread(target=self._run, name='TimetableWriter', daemon=True)
+        self._thread.start()
+
+    def submit(self, write, on_done=None):
+        """Queue write(store); on_done(result, error) runs in a later poll()"""
+        self._pending += 1
+        self._jobs.put((write, on_done))
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                self._jobs.task_done()
+                return
+            write, on_done = job
+            try:
+                outcome = (write(self.store), None)
+            except Exception as e:
+                outcome = (None, e)
+            self._finished.put((on_done, outcome))
+            self._jobs.task_done()
+
+    def poll(self):
+        """Deliver finished writes on the calling (Tk) thread; True while any are outstanding"""
+        while True:
+            try:
+                on_done, (result, error) = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            self._pending -= 1
+            if on_done is not None:
+                on_done(result, error)
+        return self._pending > 0
+
+    def wait_idle(self):
+        """Block until every write queued so far has committed; for worker threads"""
+        self._jobs.join()
+
+    def close(self):
+        """Finish the queued writes and stop the thread"""
+        self._jobs.put(None)
+        self._thread.join()
+
+
+class RepaintScheduler:
+    """Collects dirty cells and repaints them together once per Tk idle cycle"""
+
+    def __init__(self, widget, paint):
+        self.widget = widget
+        self.paint = paint
+        self._dirty = set()
+        self._job = None
+
+    def mark(self, keys):
+        self._dirty.update(keys)
+        if self._dirty and self._job is None:
+            self._job = self.widget.after_idle(self.flush)
+
+    def flush(self):
+        """Repaint everything marked so far right away"""
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        dirty, self._dirty = self._dirty, set()
+        if dirty:
+            self.paint(dirty)
+
+    def clear(self):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        self._dirty = set()
+
+# Cell highlight states shared by both grid rendering modes
+CELL_STYLES = {
+    None: 'FancyCell.TFrame',
+    'impacted': 'RedCell.TFrame',
+    'resolved': 'GreenCell.TFrame',
+    'match': 'MatchCell.TFrame',
+    'selected': 'SelectedCell.TFrame',
+    'drop_ok': 'DropOkCell.TFrame',
+    'drop_bad': 'DropBadCell.TFrame',
+}
+CELL_FILLS = {
+    None: '#eaf0fa',
+    'impacted': '#ffcccc',
+    'resolved': '#ccffcc',
+    'match': '#fff3b0',
+    'selected': '#cfe0ff',
+    'drop_ok': '#a7f3d0',
+    'drop_bad': '#fca5a5',
+}
+
+def _clip(text, limit):
+    """Shorten text for a fixed-width canvas cell"""
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+class _WidgetSlot:
+    """A Frame with subject/teacher Comboboxes that can be rebound to any cell"""
+
+    def __init__(self, grid):
+        canvas = grid.canvas
+        self.canvas = canvas
+        self.key = None
+        self.frame = ttk.Frame(canvas, style=CELL_STYLES[None])
+        self.subject_var = tk.StringVar(canvas)
+        self.teacher_var = tk.StringVar(canvas)
+        self.subject_cb = ttk.Combobox(self.frame, textvariable=self.subject_var, values=grid.subjects, width=8, state='readonly')
+        self.subject_cb.pack(side='top', fill='x', padx=1, pady=1)
+
+        # Editable teacher name; its dropdown is filled on demand from the shared directory
+        self.teacher_cb = ttk.Combobox(self.frame, textvariable=self.teacher_var, width=12)
+        self.teacher_cb.pack(side='top', fill='x', padx=1, pady=(0, 2))
+
+        self.item = canvas.create_window(-grid.CELL_WIDTH, -grid.ROW_HEIGHT, window=self.frame, anchor='nw',
+                                         width=grid.CELL_WIDTH, height=grid.ROW_HEIGHT)
+
+        # Events are handled once per grid through a shared bindtag, not per widget.
+        # It goes first so teacher choices are filled in before the dropdown posts.
+        for combobox in (self.subject_cb, self.teacher_cb):
+            combobox.bindtags((grid.BINDTAG,) + combobox.bindtags())
+        grid._register_slot(self)
+
+    def place(self, x, y):
+        self.canvas.coords(self.item, x, y)
+        self.canvas.itemconfigure(self.item, state='normal')
+
+    def show(self, subject, teacher, state):
+        self.subject_var.set(subject)
+        self.teacher_var.set(teacher)
+        self.paint(state)
+
+    def paint(self, state):
+        self.frame.configure(style=CELL_STYLES[state])
+
+    def read(self):
+        """Return the (subject, teacher) currently shown in the widgets"""
+        return self.subject_var.get(), self.teacher_var.get()
+
+    def set_choices(self, subjects):
+        self.subject_cb.configure(values=subjects)
+
+    def hide(self):
+        self.key = None
+        self.canvas.coords(self.item, -10000, -10000)
+        self.canvas.itemconfigure(self.item, state='hidden')
+
+    def widgets(self):
+        return self.subject_cb, self.teacher_cb
+
+    def destroy(self):
+        self.canvas.delete(self.item)
+        self.frame.destroy()
+
+class _CanvasSlot:
+    """A rectangle and two text items drawing one cell directly on the canvas"""
+
+    def __init__(self, grid):
+        canvas = grid.canvas
+        self.canvas = canvas
+        self.key = None
+        self.width = grid.CELL_WIDTH
+        self.height = grid.ROW_HEIGHT
+        self.rect = canvas.create_rectangle(0, 0, 0, 0, fill=CELL_FILLS[None], outline='#9ca3af', tags='cell')
+        self.subject_text = canvas.create_text(0, 0, font=("Segoe UI", 9, "bold"), fill='#1e3a8a', tags='cell')
+        self.teacher_text = canvas.create_text(0, 0, font=("Segoe UI", 9), fill='#374151', tags='cell')
+
+    def place(self, x, y):
+        canvas = self.canvas
+        canvas.coords(self.rect, x, y, x + self.width, y + self.height)
+        canvas.coords(self.subject_text, x + self.width / 2, y + self.height * 0.32)
+        canvas.coords(self.teacher_text, x + self.width / 2, y + self.height * 0.70)
+        for item in (self.rect, self.subject_text, self.teacher_text):
+            canvas.itemconfigure(item, state='normal')
+
+    def show(self, subject, teacher, state):
+        self.canvas.itemconfigure(self.subject_text, text=_clip(subject, 16))
+        self.canvas.itemconfigure(self.teacher_text, text=_clip(teacher, 18))
+        self.paint(state)
+
+    def paint(self, state):
+        self.canvas.itemconfigure(self.rect, fill=CELL_FILLS[state])
+
+    def read(self):
+        # Canvas cells are display-only; edits go through the floating editor
+        return None
+
+    def set_choices(self, subjects):
+        pass
+
+    def widgets(self):
+        return ()
+
+    def hide(self):
+        self.key = None
+        for item in (self.rect, self.subject_text, self.teacher_text):
+            self.canvas.itemconfigure(item, state='hidden')
+
+    def destroy(self):
+        self.canvas.delete(self.rect, self.subject_text, self.teacher_text)
+
+class TimetableGrid:
+    """Virtualized timetable grid drawn inside a canvas.
+
+    Only the cells inside the visible viewport are materialized. A pool of cell
+    slots is recycled and rebound to model data as the canvas scrolls, so draw
+    time and Tk memory stay flat however large the school grows. The visible
+    cells are bound at once; an overscan band of a screen above and below is
+    then built in small batches between Tk events so scrolling stays smooth.
+
+    Two rendering modes are supported: 'widgets' backs each visible cell with a
+    Frame and two Comboboxes, while 'canvas' draws cells as canvas items and
+    edits them through a single floating editor placed over the clicked cell.
+
+    The grid shows a view: a subset of the model's rows and columns chosen with
+    set_view(). Positions on the canvas are view positions; keys are always
+    model keys. Shift-click extends a rectangular selection from the last
+    clicked cell or header; selected_keys() hands it to bulk operations.
+
+    Dragging one cell onto another (Ctrl-drag in widget mode) asks check_swap
+    about each new drop target and calls on_swap on release; holding Shift
+    swaps only the teachers.
+    """
+
+    MODES = ('widgets', 'canvas')
+    BINDTAG = 'TimetableCell'
+    HEADER_HEIGHT = 40
+    ROW_HEIGHT = 56
+    CLASS_WIDTH = 90
+    SECTION_WIDTH = 70
+    CELL_WIDTH = 120
+    OVERSCAN_COLS = 2
+    BUILD_BATCH_ROWS = 3
+    RESIZE_THROTTLE_MS = 50
+    SHIFT_MASK = 0x0001
+
+    def __init__(self, canvas, model, v_scrollbar, h_scrollbar, cell_state, on_teacher_change,
+                 mode='widgets', on_build_progress=None, check_swap=None, on_swap=None):
+        self.canvas = canvas
+        self.model = model
+        self.cell_state = cell_state
+        self.on_teacher_change = on_teacher_change
+        self.on_build_progress = on_build_progress
+        self.check_swap = check_swap
+        self.on_swap = on_swap
+        self.mode = mode if mode in self.MODES else 'widgets'
+        self.subjects = []
+        self.directory = TeacherDirectory()
+        self.v_scrollbar = v_scrollbar
+        self.h_scrollbar = h_scrollbar
+        self._slots = []
+        self._free_slots = []
+        self._bound = {}
+        self._editor = None
+        self._widget_slots = {}
+        self._repaints = RepaintScheduler(canvas, self._repaint_now)
+        self._refresh_job = None
+        self._build_job = None
+        self._build_queue = []
+        self._build_cols = (0, 0)
+        self._build_total = 0
+        self._build_report = False
+        self.view_rows = []
+        self.view_cols = []
+        self._row_pos = {}
+        self._col_pos = {}
+        self._view_axes = (None, None)
+        # Geometry is derived from counts and cell sizes, never measured from Tk
+        self._extent = (1, 1)
+        self._viewport = (0, 0)
+        self._resize_job = None
+        self._scroll_first = (None, None)
+        self.selection = None
+        self._anchor = None
+        self._press_key = None
+        self._drag_target = None
+        self._drag_ok = True
+        self._drag_teachers_only = False
+
+        canvas.configure(xscrollcommand=self._on_xscroll, yscrollcommand=self._on_yscroll,
+                         xscrollincrement=self.CELL_WIDTH, yscrollincrement=self.ROW_HEIGHT)
+        canvas.bind("<Configure>", self._on_configure)
+        canvas.bind("<Button-1>", self._on_canvas_click, add='+')
+        canvas.bind("<Shift-Button-1>", lambda e: self._on_canvas_click(e, extend=True))
+        canvas.bind("<B1-Motion>", self._on_drag_motion)
+        canvas.bind("<ButtonRelease-1>", self._on_drag_release)
+        canvas.bind_class(self.BINDTAG, '<<ComboboxSelected>>', self._on_cell_selected)
+        canvas.bind_class(self.BINDTAG, '<Return>', self._on_cell_return)
+        canvas.bind_class(self.BINDTAG, '<FocusOut>', self._on_cell_focus_out)
+        canvas.bind_class(self.BINDTAG, '<Escape>', self._on_cell_escape)
+        canvas.bind_class(self.BINDTAG, '<Button-1>', self._on_cell_press)
+        canvas.bind_class(self.BINDTAG, '<Shift-Button-1>', self._on_cell_extend)
+        canvas.bind_class(self.BINDTAG, '<Control-Button-1>', self._on_cell_grab)
+        canvas.bind_class(self.BINDTAG, '<B1-Motion>', self._on_drag_motion)
+        canvas.bind_class(self.BINDTAG, '<ButtonRelease-1>', self._on_drag_release)
+        canvas.bind_class(self.BINDTAG, '<Down>', self._on_teacher_open)
+        canvas.bind_class(self.BINDTAG, '<KeyRelease>', self._on_teacher_typed)
+        model.add_listener(self._on_model_change)
+
+    @property
+    def fixed_width(self):
+        return self.CLASS_WIDTH + self.SECTION_WIDTH
+
+    def set_mode(self, mode):
+        """Switch between widget-backed and canvas-drawn cells"""
+        if mode not in self.MODES or mode == self.mode:
+            return
+        self.close_editor()
+        self._repaints.flush()
+        for slot in self._bound.values():
+            self._commit(slot)
+        for slot in self._slots:
+            for widget in slot.widgets():
+                self._widget_slots.pop(str(widget), None)
+            slot.destroy()
+        self._slots.clear()
+        self._free_slots.clear()
+        self._bound.clear()
+        self.mode = mode
+        self.refresh()
+
+    def set_choices(self, subjects, teachers, teacher_subjects=None):
+        """Update the subject dropdowns in place and re-index the teacher directory"""
+        self.subjects = list(subjects)
+        self.directory.update(teachers, teacher_subjects)
+        for slot in self._slots:
+            slot.set_choices(self.subjects)
+        if self._editor is not None:
+            self._editor.set_choices(self.subjects)
+
+    def set_view(self, rows=None, cols=None):
+        """Show only the given model row and column indices; None means all"""
+        rows = list(range(len(self.model.rows))) if rows is None else list(rows)
+        cols = list(range(len(self.model.cols))) if cols is None else list(cols)
+        changed = rows != self.view_rows or cols != self.view_cols
+        self.selection = self._anchor = None
+        self.close_editor()
+        self._repaints.flush()
+        for slot in self._bound.values():
+            self._release(slot)
+        self._bound.clear()
+        self.view_rows, self.view_cols = rows, cols
+        self._row_pos = {row: pos for pos, row in enumerate(rows)}
+        self._col_pos = {col: pos for pos, col in enumerate(cols)}
+        self._view_axes = (self.model.rows, self.model.cols)
+        if changed:
+            self.canvas.xview_moveto(0)
+            self.canvas.yview_moveto(0)
+        self.layout()
+
+    def layout(self):
+        """Size the scroll region from the view dimensions and redraw"""
+        rows, cols = self._view_axes
+        if rows is not self.model.rows or cols is not self.model.cols:
+            # The model was reshaped, so any filtered view no longer applies
+            self.view_rows = list(range(len(self.model.rows)))
+            self.view_cols = list(range(len(self.model.cols)))
+            self._row_pos = {row: row for row in self.view_rows}
+            self._col_pos = {col: col for col in self.view_cols}
+            self._view_axes = (self.model.rows, self.model.cols)
+        width = self.fixed_width + len(self.view_cols) * self.CELL_WIDTH
+        height = self.HEADER_HEIGHT + len(self.view_rows) * self.ROW_HEIGHT
+        self._extent = (width, height)
+        self.canvas.configure(scrollregion=(0, 0, width, height))
+        self.refresh(report=True)
+
+    def view_key(self, row, col):
+        """Model key of the cell at a view position"""
+        return self.model.rows[self.view_rows[row]] + self.model.cols[self.view_cols[col]]
+
+    def view_position(self, key):
+        """View (row, col) of a model key, or None if the view hides it"""
+        row = self._row_pos.get(self.model.row_index.get(key[:2]))
+        col = self._col_pos.get(self.model.col_index.get(key[2:]))
+        if row is None or col is None:
+            return None
+        return row, col
+
+    def schedule_refresh(self):
+        """Coalesce viewport refreshes into one per idle cycle"""
+        if self._refresh_job is None:
+            self._refresh_job = self.canvas.after_idle(self.refresh)
+
+    def cell_origin(self, row, col):
+        """Canvas coordinates of the top-left corner of the cell at a view position"""
+        return self.fixed_width + col * self.CELL_WIDTH, self.HEADER_HEIGHT + row * self.ROW_HEIGHT
+
+    def select(self, anchor, end=None):
+        """Select the rectangle between two view positions; -1 stands for a header.
+
+        A header position selects its whole row or column.
+        """
+        end = end or anchor
+        last_row, last_col = len(self.view_rows) - 1, len(self.view_cols) - 1
+        if anchor[0] < 0 or end[0] < 0:
+            r0, r1 = 0, last_row
+        else:
+            r0, r1 = sorted((anchor[0], end[0]))
+        if anchor[1] < 0 or end[1] < 0:
+            c0, c1 = 0, last_col
+        else:
+            c0, c1 = sorted((anchor[1], end[1]))
+        old = self.selection
+        self._anchor = anchor
+        self.selection = (r0, c0, r1, c1) if r0 <= r1 and c0 <= c1 else None
+        if self._is_range(old) or self._is_range(self.selection):
+            # Only materialized cells show the highlight, so only they need repainting
+            self.repaint(list(self._bound))
+
+    def clear_selection(self):
+        old = self.selection
+        self.selection = self._anchor = None
+        if self._is_range(old):
+            self.repaint(list(self._bound))
+
+    @staticmethod
+    def _is_range(selection):
+        return selection is not None and (selection[0], selection[1]) != (selection[2], selection[3])
+
+    def selected_keys(self, min_rows=1, min_cols=1):
+        """Model keys of the selection as a list of rows, grown from its top-left
+        corner to at least min_rows x min_cols where the view allows"""
+        if self.selection is None:
+            return []
+        r0, c0, r1, c1 = self.selection
+        r1 = min(max(r1, r0 + min_rows - 1), len(self.view_rows) - 1)
+        c1 = min(max(c1, c0 + min_cols - 1), len(self.view_cols) - 1)
+        return [[self.view_key(row, col) for col in range(c0, c1 + 1)] for row in range(r0, r1 + 1)]
+
+    def _state(self, key):
+        if self._drag_target is not None:
+            if key == self._drag_target:
+                return 'drop_ok' if self._drag_ok else 'drop_bad'
+            if key == self._press_key:
+                return 'selected'
+        selection = self.selection
+        # A lone selected cell is already marked by focus or the editor
+        if self._is_range(selection):
+            pos = self.view_position(key)
+            if pos is not None and selection[0] <= pos[0] <= selection[2] and selection[1] <= pos[1] <= selection[3]:
+                return 'selected'
+        return self.cell_state(key)
+
+    def _position_at(self, x, y):
+        """View (row, col) under canvas coordinates, -1 for a header, or None"""
+        row = -1 if y < self.HEADER_HEIGHT else int((y - self.HEADER_HEIGHT) // self.ROW_HEIGHT)
+        col = -1 if x < self.fixed_width else int((x - self.fixed_width) // self.CELL_WIDTH)
+        if row >= len(self.view_rows) or col >= len(self.view_cols) or (row < 0 and col < 0):
+            return None
+        return row, col
+
+    def see(self, key):
+        """Scroll so a cell is centred on screen; returns False if the view hides it"""
+        pos = self.view_position(key)
+        if pos is None:
+            return False
+        x, y = self.cell_origin(*pos)
+        width, height = self._extent
+        view_width, view_height = self._viewport
+        left = x + self.CELL_WIDTH / 2 - view_width / 2
+        top = y + self.ROW_HEIGHT / 2 - view_height / 2
+        self.canvas.xview_moveto(max(0, left) / width)
+        self.canvas.yview_moveto(max(0, top) / height)
+        return True
+
+    def visible_range(self):
+        """Return the view range (first_row, end_row, first_col, end_col) on screen"""
+        x0 = self.canvas.canvasx(0)
+        y0 = self.canvas.canvasy(0)
+        width, height = self._viewport
+        c0 = max(0, int((x0 - self.fixed_width) // self.CELL_WIDTH))
+        c1 = min(len(self.view_cols), int((x0 + width - self.fixed_width) // self.CELL_WIDTH) + 1)
+        r0 = max(0, int((y0 - self.HEADER_HEIGHT) // self.ROW_HEIGHT))
+        r1 = min(len(self.view_rows), int((y0 + height - self.HEADER_HEIGHT) // self.ROW_HEIGHT) + 1)
+        return r0, r1, c0, c1
+
+    def refresh(self, report=False):
+        """Bind the visible cells now and schedule the overscan band around them.
+
+        With report=True the band build is reported through on_build_progress.
+        """
+        if self._refresh_job is not None:
+            self.canvas.after_cancel(self._refresh_job)
+            self._refresh_job = None
+
+        r0, r1, c0, c1 = self.visible_range()
+        screen_rows = max(1, r1 - r0)
+        band = (max(0, r0 - screen_rows), min(len(self.view_rows), r1 + screen_rows),
+                max(0, c0 - self.OVERSCAN_COLS), min(len(self.view_cols), c1 + self.OVERSCAN_COLS))
+        br0, br1, bc0, bc1 = band
+
+        self._repaints.flush()
+        for key in list(self._bound):
+            pos = self.view_position(key)
+            if pos is None or not (br0 <= pos[0] < br1 and bc0 <= pos[1] < bc1):
+                self._release(self._bound.pop(key))
+        for row in range(r0, r1):
+            self._bind_row(row, c0, c1)
+
+        self._draw_headers(r0, r1, c0, c1)
+
+        # Fill the rest of the band nearest-first: visible rows' side columns,
+        # then alternately the rows just below and just above the viewport
+        order = list(range(r0, r1))
+        below, above = r1, r0 - 1
+        while below < br1 or above >= br0:
+            if below < br1:
+                order.append(below)
+                below += 1
+            if above >= br0:
+                order.append(above)
+                above -= 1
+        self._start_build(order, (bc0, bc1), report)
+
+    def cancel_build(self):
+        """Stop building the overscan band; returns True if a build was running"""
+        if self._build_job is None:
+            return False
+        self.canvas.after_cancel(self._build_job)
+        self._build_job = None
+        self._build_queue = []
+        if self._build_report and self.on_build_progress:
+            self.on_build_progress(None, None)
+        return True
+
+    def _start_build(self, rows, cols, report):
+        was_reporting = self._build_report and self._build_job is not None
+        if self._build_job is not None:
+            self.canvas.after_cancel(self._build_job)
+            self._build_job = None
+        self._build_queue = rows
+        self._build_cols = cols
+        self._build_total = len(rows)
+        self._build_report = report or was_reporting
+        if rows:
+            self._build_job = self.canvas.after(1, self._build_step)
+        elif self._build_report and self.on_build_progress:
+            self.on_build_progress(0, 0)
+
+    def _build_step(self):
+        self._build_job = None
+        batch = self._build_queue[:self.BUILD_BATCH_ROWS]
+        self._build_queue = self._build_queue[self.BUILD_BATCH_ROWS:]
+        for row in batch:
+            self._bind_row(row, *self._build_cols)
+        if self._build_report and self.on_build_progress:
+            self.on_build_progress(self._build_total - len(self._build_queue), self._build_total)
+        if self._build_queue:
+            # Yield to the event loop between batches
+            self._build_job = self.canvas.after(1, self._build_step)
+
+    def _bind_row(self, row, c0, c1):
+        class_section = self.model.rows[self.view_rows[row]]
+        cols, view_cols = self.model.cols, self.view_cols
+        for col in range(c0, c1):
+            key = class_section + cols[view_cols[col]]
+            if key not in self._bound:
+                self._bind(self._acquire(), key, row, col)
+
+    def repaint(self, keys):
+        """Mark cells dirty; they are repainted together on the next idle cycle"""
+        self._repaints.mark(keys)
+
+    def _repaint_now(self, keys):
+        # Only materialized cells cost any Tk work
+        for key in keys & self._bound.keys():
+            self._bound[key].show(*self.model.get(key), self._state(key))
+        editor = self._editor
+        if editor is not None and editor.key in keys:
+            editor.show(*self.model.get(editor.key), self._state(editor.key))
+
+    def open_editor(self, key):
+        """Show the floating subject/teacher editor over a cell"""
+        self.close_editor()
+        if self._editor is None:
+            self._editor = _WidgetSlot(self)
+        pos = self.view_position(key)
+        if pos is None:
+            return
+        self._editor.key = key
+        self._editor.place(*self.cell_origin(*pos))
+        self._editor.show(*self.model.get(key), self._state(key))
+        # Focus after the click has finished focusing the canvas itself
+        self.canvas.after_idle(self._editor.teacher_cb.focus_set)
+
+    def close_editor(self, commit=True):
+        if self._editor is None or self._editor.key is None:
+            return
+        if commit:
+            # Widgets still showing values from before a pending repaint would undo newer model edits
+            self._repaints.flush()
+            self._commit(self._editor)
+        self._editor.hide()
+        self.canvas.focus_set()
+
+    def _acquire(self):
+        if self._free_slots:
+            return self._free_slots.pop()
+        slot = _CanvasSlot(self) if self.mode == 'canvas' else _WidgetSlot(self)
+        self._slots.append(slot)
+        return slot
+
+    def _bind(self, slot, key, row, col):
+        slot.key = key
+        self._bound[key] = slot
+        slot.place(*self.cell_origin(row, col))
+        slot.show(*self.model.get(key), self._state(key))
+
+    def _release(self, slot):
+        # Keep any teacher name typed but not yet confirmed with Return. Callers
+        # flush pending repaints first, so the widgets are not behind the model.
+        self._commit(slot)
+        self._hide(slot)
+
+    def _hide(self, slot):
+        slot.hide()
+        self._free_slots.append(slot)
+
+    def _commit(self, slot, teacher_event=False, force=False, close=False):
+        """Write a slot's widget values back into the model"""
+        key = slot.key
+        values = slot.read() if key is not None else None
+        if values is None:
+            return
+        subject, teacher = values
+        teacher_changed = teacher != self.model.get(key)[1]
+        self.model.set(key, subject, teacher)
+        if teacher_event and (teacher_changed or force):
+            self.on_teacher_change(key)
+        if close and slot is self._editor:
+            self.close_editor(commit=False)
+
+    def _register_slot(self, slot):
+        for widget in slot.widgets():
+            self._widget_slots[str(widget)] = slot
+
+    def _slot_event(self, event):
+        """Resolve the slot behind an event and whether it came from the teacher box"""
+        slot = self._widget_slots.get(str(event.widget))
+        if slot is None:
+            return None, False
+        return slot, str(event.widget) == str(slot.teacher_cb)
+
+    def _on_cell_selected(self, event):
+        slot, is_teacher = self._slot_event(event)
+        if slot is not None:
+            self._commit(slot, teacher_event=is_teacher, force=is_teacher)
+
+    def _on_cell_return(self, event):
+        slot, is_teacher = self._slot_event(event)
+        if slot is not None and is_teacher:
+            self._commit(slot, teacher_event=True, force=True, close=True)
+
+    def _on_cell_focus_out(self, event):
+        slot, is_teacher = self._slot_event(event)
+        if slot is not None and is_teacher:
+            self._commit(slot, teacher_event=True)
+
+    def _on_cell_escape(self, event):
+        slot, _ = self._slot_event(event)
+        if slot is not None and slot is self._editor:
+            self.close_editor(commit=False)
+
+    def _on_teacher_open(self, event):
+        slot, is_teacher = self._slot_event(event)
+        if not is_teacher:
+            return
+        # A complete name shows the full ranked list, partial text filters it
+        text = slot.teacher_var.get()
+        self._offer_teachers(slot, '' if text in self.directory else text)
+
+    def _on_teacher_typed(self, event):
+        slot, is_teacher = self._slot_event(event)
+        edited = (event.char and event.char.isprintable()) or event.keysym in ('BackSpace', 'Delete')
+        if is_teacher and edited:
+            self._offer_teachers(slot, slot.teacher_var.get())
+
+    def _offer_teachers(self, slot, prefix):
+        slot.teacher_cb.configure(values=self.directory.matches(prefix, slot.subject_var.get()))
+
+    def _on_canvas_click(self, event, extend=False):
+        pos = self._position_at(self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        if extend and pos is not None and self._anchor is not None:
+            self.close_editor()
+            self.select(self._anchor, pos)
+            self.canvas.focus_set()
+            return 'break'
+        if pos is None:
+            self.close_editor()
+            self.clear_selection()
+            return None
+        self.select(pos)
+        if self.mode == 'canvas' and pos[0] >= 0 and pos[1] >= 0:
+            self._press_key = self.view_key(*pos)
+            self.open_editor(self._press_key)
+        else:
+            self.close_editor()
+        return None
+
+    def _on_cell_press(self, event):
+        slot, _ = self._slot_event(event)
+        pos = self.view_position(slot.key) if slot is not None and slot.key is not None else None
+        if pos is not None:
+            self.select(pos)
+        self._on_teacher_open(event)
+
+    def _on_cell_grab(self, event):
+        slot, _ = self._slot_event(event)
+        if slot is not None and slot.key is not None:
+            self._press_key = slot.key
+            self.canvas.focus_set()
+        return 'break'
+
+    def _on_drag_motion(self, event):
+        source = self._press_key
+        if source is None or self.on_swap is None:
+            return None
+        # Widget events report coordinates relative to the widget, so go through the screen
+        x = self.canvas.canvasx(event.x_root - self.canvas.winfo_rootx())
+        y = self.canvas.canvasy(event.y_root - self.canvas.winfo_rooty())
+        pos = self._position_at(x, y)
+        target = self.view_key(*pos) if pos is not None and pos[0] >= 0 and pos[1] >= 0 else None
+        if target == source:
+            target = None
+        teachers_only = bool(event.state & self.SHIFT_MASK)
+        if (target, teachers_only) == (self._drag_target, self._drag_teachers_only):
+            return 'break'
+        if self._drag_target is None:
+            self.close_editor()
+        previous = self._drag_target
+        self._drag_target, self._drag_teachers_only = target, teachers_only
+        # One check per new drop target, not per motion event
+        self._drag_ok = target is None or self.check_swap is None or self.check_swap(source, target, teachers_only)
+        self.repaint([key for key in (source, previous, target) if key is not None])
+        return 'break'
+
+    def _on_drag_release(self, event):
+        source, target = self._press_key, self._drag_target
+        self._press_key = self._drag_target = None
+        if target is None:
+            return None
+        self.repaint([source, target])
+        self.on_swap(source, target, self._drag_teachers_only)
+        return 'break'
+
+    def _on_cell_extend(self, event):
+        slot, _ = self._slot_event(event)
+        pos = self.view_position(slot.key) if slot is not None and slot.key is not None else None
+        if pos is None:
+            return 'break'
+        self.select(self._anchor or pos, pos)
+        # Keep the dropdown closed and take focus so the bulk shortcuts reach the canvas
+        self.canvas.focus_set()
+        return 'break'
+
+    def _on_model_change(self, changes):
+        if changes is None:
+            # Axes may have changed, so drop every binding before re-laying out
+            if self._editor is not None:
+                self._editor.hide()
+            for slot in self._bound.values():
+                self._hide(slot)
+            self._bound.clear()
+            self._repaints.clear()
+            self.selection = self._anchor = None
+            self.layout()
+            return
+        key_at = self.model.key_at
+        self._repaints.mark(key_at(index) for index, _, _ in changes)
+
+    def _draw_headers(self, r0, r1, c0, c1):
+        canvas = self.canvas
+        canvas.delete('header')
+        header_box = {'fill': '#2d6cdf', 'outline': '#ffffff', 'tags': 'header'}
+        header_text = {'fill': '#ffffff', 'font': ("Segoe UI", 10, "bold"), 'justify': 'center', 'tags': 'header'}
+        row_box = {'fill': '#f0f4f8', 'outline': '#9ca3af', 'tags': 'header'}
+        row_text = {'fill': '#000000', 'font': ("Segoe UI", 10), 'tags': 'header'}
+
+        height = self.HEADER_HEIGHT
+        canvas.create_rectangle(0, 0, self.CLASS_WIDTH, height, **header_box)
+        canvas.create_text(self.CLASS_WIDTH / 2, height / 2, text="Class", **header_text)
+        canvas.create_rectangle(self.CLASS_WIDTH, 0, self.fixed_width, height, **header_box)
+        canvas.create_text(self.CLASS_WIDTH + self.SECTION_WIDTH / 2, height / 2, text="Section", **header_text)
+
+        for c in range(c0, c1):
+            day, period = self.model.cols[self.view_cols[c]]
+            x = self.fixed_width + c * self.CELL_WIDTH
+            canvas.create_rectangle(x, 0, x + self.CELL_WIDTH, height, **header_box)
+            canvas.create_text(x + self.CELL_WIDTH / 2, height / 2, text=f"{day}\nP{period+1}", **header_text)
+
+        for r in range(r0, r1):
+            class_, section = self.model.rows[self.view_rows[r]]
+            y = height + r * self.ROW_HEIGHT
+            canvas.create_rectangle(0, y, self.CLASS_WIDTH, y + self.ROW_HEIGHT, **row_box)
+            canvas.create_text(self.CLASS_WIDTH / 2, y + self.ROW_HEIGHT / 2, text=class_, **row_text)
+            canvas.create_rectangle(self.CLASS_WIDTH, y, self.fixed_width, y + self.ROW_HEIGHT, **row_box)
+            canvas.create_text(self.CLASS_WIDTH + self.SECTION_WIDTH / 2, y + self.ROW_HEIGHT / 2, text=section, **row_text)
+
+    def _on_configure(self, event):
+        size = (event.width, event.height)
+        if size == self._viewport:
+            return
+        self._viewport = size
+        # Live resizing sends a stream of events; rebind at most once per interval
+        if self._resize_job is None:
+            self._resize_job = self.canvas.after(self.RESIZE_THROTTLE_MS, self._on_resize_settled)
+
+    def _on_resize_settled(self):
+        self._resize_job = None
+        self.refresh()
+
+    def _on_xscroll(self, first, last):
+        self.h_scrollbar.set(first, last)
+        # Resizing also reports here; only a moved offset needs a rebind now
+        if first != self._scroll_first[0]:
+            self._scroll_first = (first, self._scroll_first[1])
+            self.schedule_refresh()
+
+    def _on_yscroll(self, first, last):
+        self.v_scrollbar.set(first, last)
+        if first != self._scroll_first[1]:
+            self._scroll_first = (self._scroll_first[0], first)
+            self.schedule_refresh()
+
 class TimetableApp:
+    UNDO_LIMIT = 50
+    JOURNAL_INTERVAL_MS = 3000  # Unsaved edits are group-committed to the journal this often
+    WEEK_CACHE_BYTES = 16 * 1024 * 1024
+
     def __init__(self, root):
         self.root = root
         # Set basic properties first
@@ -349,12 +2171,30 @@ class TimetableApp:
         self.current_week = datetime.now().isocalendar()[1]
         self.selected_week = tk.IntVar(value=self.current_week)
         self.selected_year = tk.IntVar(value=datetime.now().year)
+        # Template weeks store only their differences from the base template
+        self.template_week = tk.BooleanVar(value=False)
         self.impacted_cells = set()
         self.resolved_cells = set()
-        self.entries = {}
-        self.teacher_cbs = {}
-        self.cell_frames = {}
         self.current_impacted_periods = []
+        self._load_generation = 0
+        # Cells edited since the last load or save of _clean_week (year, week, template);
+        # a reset forces a full save
+        self._dirty = set()
+        self._dirty_all = True
+        self._clean_week = None
+        self._save_label_job = None
+        # Saves requested while one is being written collapse into a single follow-up save
+        self._save_in_flight = False
+        self._save_again = False
+        # Edits not yet in the journal, {key: (subject, teacher)}
+        self._journal = {}
+        self._journal_job = None
+        self._clipboard = None
+        self._undo_stack = []
+        self.search_hits = set()
+        self._search_order = []
+        self._search_pos = -1
+        self._search_job = None
         self.datetime_label = None  # Will be set in setup_ui
         
         # Show loading message
@@ -388,7 +2228,15 @@ class TimetableApp:
         self.root.after(100, self.check_internet_connection)
         
         # Load timetable data in background
-        self.root.after(200, self.load_timetable)
+        self.root.after(200, self.restore_journal)
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
+
+    def exit_app(self):
+        """Let queued saves and journal entries reach the database, then close"""
+        self._flush_journal()
+        self.writer.close()
+        self.store.close()
+        self.root.destroy()
 
     def check_internet_connection(self):
         """Quick internet connectivity check - non-blocking"""
@@ -424,6 +2272,10 @@ class TimetableApp:
         self.style.configure('TCombobox', font=("Segoe UI", 10))
         self.style.configure('RedCell.TFrame', background="#ffcccc", borderwidth=2, relief="solid")
         self.style.configure('GreenCell.TFrame', background="#ccffcc", borderwidth=2, relief="solid")
+        self.style.configure('MatchCell.TFrame', background="#fff3b0", borderwidth=2, relief="solid")
+        self.style.configure('SelectedCell.TFrame', background="#cfe0ff", borderwidth=2, relief="solid")
+        self.style.configure('DropOkCell.TFrame', background="#a7f3d0", borderwidth=2, relief="solid")
+        self.style.configure('DropBadCell.TFrame', background="#fca5a5", borderwidth=2, relief="solid")
         self.style.configure('FancyCell.TFrame', background="#eaf0fa", borderwidth=1, relief="solid")
         self.style.configure('FancyCell.TLabel', background="#eaf0fa", font=("Segoe UI", 9))
 
@@ -468,37 +2320,11 @@ class TimetableApp:
         return DEFAULT_CONFIG.copy()
 
     def setup_db(self):
-        """Optimized database setup with faster connection"""
-        self.conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-        self.conn.execute('PRAGMA journal_mode=WAL')  # Faster writes
-        self.conn.execute('PRAGMA synchronous=NORMAL')  # Better performance
-        self.c = self.conn.cursor()
-        
-        # Quick table existence check
-        self.c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='timetable'")
-        if not self.c.fetchone():
-            # Create table only if it doesn't exist
-            self.c.execute('''CREATE TABLE timetable (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                year INTEGER,
-                week INTEGER,
-                class TEXT,
-                section TEXT,
-                day TEXT,
-                period INTEGER,
-                subject TEXT,
-                teacher TEXT
-            )''')
-        else:
-            # Quick column existence check
-            self.c.execute('PRAGMA table_info(timetable)')
-            columns = [row[1] for row in self.c.fetchall()]
-            if 'year' not in columns:
-                self.c.execute('ALTER TABLE timetable ADD COLUMN year INTEGER')
-            if 'week' not in columns:
-                self.c.execute('ALTER TABLE timetable ADD COLUMN week INTEGER')
-        
-        self.conn.commit()
+        """Open the timetable store, migrating the database schema if needed"""
+        self.store = TimetableStore(DB_FILE)
+        self.writer = TimetableWriter(self.store)
+        self.week_cache = WeekCache(self.WEEK_CACHE_BYTES)
+        self._writer_poll_job = None
 
     def create_menu_bar(self):
         """Create menu bar with upgrade and help options"""
@@ -511,10 +2337,14 @@ class TimetableApp:
         file_menu.add_command(label="📁 Load Timetable", command=self.load_timetable)
         file_menu.add_command(label="💾 Save Timetable", command=self.save_timetable)
         file_menu.add_separator()
+        file_menu.add_command(label="📐 Save as Template", command=self.save_as_template)
+        file_menu.add_command(label="🆕 New Week from Template", command=self.new_week_from_template)
+        file_menu.add_command(label="⏩ Roll Forward", command=self.roll_forward)
+        file_menu.add_separator()
         file_menu.add_command(label="📊 Export Excel", command=self.export_excel)
         file_menu.add_command(label="📄 Export PDF", command=self.export_pdf)
         file_menu.add_separator()
-        file_menu.add_command(label="❌ Exit", command=self.root.quit)
+        file_menu.add_command(label="❌ Exit", command=self.exit_app)
         
         # License menu (prominent for upgrades)
         license_menu = tk.Menu(menubar, tearoff=0)
@@ -536,6 +2366,24 @@ class TimetableApp:
             else:
                 license_menu.add_command(label="📋 Free Version Limits", command=self.show_free_limits)
         
+        # Edit menu - bulk operations on the selected cells
+        edit_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Edit", menu=edit_menu)
+        edit_menu.add_command(label="↩️ Undo", command=self.undo_bulk_edit, accelerator="Ctrl+Z")
+        edit_menu.add_separator()
+        edit_menu.add_command(label="📋 Copy Cells", command=self.copy_cells, accelerator="Ctrl+C")
+        edit_menu.add_command(label="📌 Paste Cells", command=self.paste_cells, accelerator="Ctrl+V")
+        edit_menu.add_command(label="⬇️ Fill From First Cell", command=self.fill_cells, accelerator="Ctrl+D")
+        edit_menu.add_command(label="🧹 Clear Cells", command=self.clear_cells, accelerator="Delete")
+        
+        # View menu
+        view_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="View", menu=view_menu)
+        view_menu.add_radiobutton(label="🧩 Editable Cells", variable=self.grid_mode,
+                                  value='widgets', command=self.set_grid_mode)
+        view_menu.add_radiobutton(label="⚡ Fast Canvas Cells", variable=self.grid_mode,
+                                  value='canvas', command=self.set_grid_mode)
+        
         # Tools menu
         tools_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Tools", menu=tools_menu)
@@ -543,6 +2391,8 @@ class TimetableApp:
         tools_menu.add_command(label="✨ Smart Match", command=self.smart_match)
         tools_menu.add_command(label="👨‍🏫 Teacher Mapping", command=self.show_teacher_subject_mapping)
         tools_menu.add_command(label="🏖️ Teacher Leave", command=self.mark_leave)
+        tools_menu.add_command(label="📅 Teacher Week", command=self.show_teacher_week)
+        tools_menu.add_command(label="✏️ Rename Teacher", command=self.rename_teacher)
         tools_menu.add_command(label="🔒 Edit Restrictions", command=self.edit_restrictions)
         
         # Help menu
@@ -556,6 +2406,9 @@ class TimetableApp:
         help_menu.add_command(label="ℹ️ About ClassFlow", command=self.show_about)
 
     def setup_ui(self):
+        # Grid rendering mode, shared by the View menu and the grid
+        self.grid_mode = tk.StringVar(value=self.config.get('grid_mode', 'widgets'))
+        
         # Create menu bar for easy access to upgrade and help
         self.create_menu_bar()
         
@@ -663,6 +2516,31 @@ class TimetableApp:
         ttk.Label(left_frame, text="Week:").pack(side='left')
         ttk.Entry(left_frame, textvariable=self.selected_week, width=4).pack(side='left', padx=5)
         ttk.Button(left_frame, text="Load", command=self.load_timetable).pack(side='left', padx=5)
+        ttk.Checkbutton(left_frame, text="📐 Template week", variable=self.template_week).pack(side='left', padx=5)
+        
+        # View filter - show one class, one day or one teacher's week
+        self.view_mode = tk.StringVar(value='All')
+        self.view_value = tk.StringVar()
+        ttk.Label(left_frame, text="View:").pack(side='left', padx=(15, 0))
+        view_mode_cb = ttk.Combobox(left_frame, textvariable=self.view_mode, state='readonly', width=8,
+                                    values=['All', 'Class', 'Day', 'Teacher'])
+        view_mode_cb.pack(side='left', padx=5)
+        view_mode_cb.bind('<<ComboboxSelected>>', self._on_view_mode_selected)
+        self.view_value_cb = ttk.Combobox(left_frame, textvariable=self.view_value, state='disabled', width=16)
+        self.view_value_cb.pack(side='left', padx=5)
+        self.view_value_cb.bind('<<ComboboxSelected>>', lambda e: self.apply_view_filter())
+        
+        # Search - highlights matching cells, Enter/arrows jump between them
+        self.search_var = tk.StringVar()
+        ttk.Label(left_frame, text="🔍").pack(side='left', padx=(15, 0))
+        search_entry = ttk.Entry(left_frame, textvariable=self.search_var, width=18)
+        search_entry.pack(side='left', padx=5)
+        search_entry.bind('<KeyRelease>', self._on_search_typed)
+        search_entry.bind('<Return>', lambda e: self.jump_to_match(1))
+        search_entry.bind('<Shift-Return>', lambda e: self.jump_to_match(-1))
+        ttk.Button(left_frame, text="◀", width=2, command=lambda: self.jump_to_match(-1)).pack(side='left')
+        ttk.Button(left_frame, text="▶", width=2, command=lambda: self.jump_to_match(1)).pack(side='left')
+        ttk.Button(left_frame, text="All Weeks", command=self.search_all_weeks).pack(side='left', padx=5)
         
         # Right side - Prominent SAVE button (v1.4 style)
         save_frame = ttk.Frame(controls)
@@ -837,26 +2715,36 @@ class TimetableApp:
         self.grid_container.pack(fill='both', expand=True, padx=10, pady=10)
         
         # Create canvas and scrollbars for the grid
-        self.grid_canvas = tk.Canvas(self.grid_container, highlightthickness=0)
+        self.grid_canvas = tk.Canvas(self.grid_container, highlightthickness=0, bg="#f0f4f8")
         self.v_scrollbar = ttk.Scrollbar(self.grid_container, orient="vertical", command=self.grid_canvas.yview)
         self.h_scrollbar = ttk.Scrollbar(self.grid_container, orient="horizontal", command=self.grid_canvas.xview)
         
-        self.grid_frame = ttk.Frame(self.grid_canvas)
-        
-        # Configure scrollbars
-        self.grid_canvas.configure(yscrollcommand=self.v_scrollbar.set, xscrollcommand=self.h_scrollbar.set)
-        
         # Pack scrollbars and canvas
         self.v_scrollbar.pack(side="right", fill="y")
         self.h_scrollbar.pack(side="bottom", fill="x")
         self.grid_canvas.pack(side="left", fill="both", expand=True)
         
-        # Create window in canvas
-        self.canvas_frame = self.grid_canvas.create_window((0, 0), window=self.grid_frame, anchor="nw")
+        # Virtualized grid - only the visible cells are backed by widgets
+        self.model = TimetableModel(self.config)
+        # Registered before the grid so it never paints stale search hits after a reset
+        self.model.add_listener(self._on_search_reset)
+        self.grid_view = TimetableGrid(self.grid_canvas, self.model, self.v_scrollbar, self.h_scrollbar,
+                                       self._cell_state, self._on_teacher_change, mode=self.grid_mode.get(),
+                                       on_build_progress=self._on_grid_build_progress,
+                                       check_swap=self._check_swap, on_swap=self._on_swap)
+        self.timetable_index = TimetableIndex(self.model)
+        self.model.add_listener(self._on_model_reset)
+        self.model.add_listener(self._on_search_stale)
+        self.model.add_listener(self._on_cells_edited)
+        
+        # Bulk edit shortcuts act on the canvas so typing in a cell keeps its own Ctrl+C/V
+        self.grid_canvas.bind("<Control-c>", lambda e: self.copy_cells())
+        self.grid_canvas.bind("<Control-v>", lambda e: self.paste_cells())
+        self.grid_canvas.bind("<Control-d>", lambda e: self.fill_cells())
+        self.grid_canvas.bind("<Delete>", lambda e: self.clear_cells())
+        self.grid_canvas.bind("<Control-z>", lambda e: self.undo_bulk_edit())
         
         # Bind events for scrolling
-        self.grid_frame.bind("<Configure>", self._on_frame_configure)
-        self.grid_canvas.bind("<Configure>", self._on_canvas_configure)
         self.grid_canvas.bind_all("<MouseWheel>", self._on_mousewheel)
         
         # Add additional scroll event bindings
@@ -867,6 +2755,12 @@ class TimetableApp:
                                  bg="#f0f0f0", font=("Segoe UI", 9))
         self.status_bar.pack(fill="x", side="bottom")
         
+        # Grid build progress, shown inside the status bar while rows are being built
+        self.build_progress = ttk.Progressbar(self.status_bar, length=160, mode='determinate')
+        self.build_cancel_btn = tk.Button(self.status_bar, text="✖", command=self.grid_view.cancel_build,
+                                          font=("Segoe UI", 8), bg="#f0f0f0", relief='flat', bd=0, cursor='hand2')
+        self.root.bind("<Escape>", lambda e: self.grid_view.cancel_build(), add='+')
+        
         # Add footer message
         footer_frame = tk.Frame(self.root, bg="#1e3a8a", height=30)
         footer_frame.pack(fill='x', side='bottom')
@@ -1790,35 +3684,6 @@ Premium features include:
         
         self.status_bar.config(text=status_text)
 
-    def _on_frame_configure(self, event):
-        """Reset the scroll region to encompass the inner frame"""
-        self.grid_canvas.configure(scrollregion=self.grid_canvas.bbox("all"))
-        # Ensure both horizontal and vertical scrolling work properly
-        canvas_width = self.grid_canvas.winfo_width()
-        canvas_height = self.grid_canvas.winfo_height()
-        frame_width = self.grid_frame.winfo_reqwidth()
-        frame_height = self.grid_frame.winfo_reqheight()
-        
-        # Configure canvas item size for proper scrolling
-        if frame_width > canvas_width or frame_height > canvas_height:
-            self.grid_canvas.itemconfig(self.canvas_frame, width=max(frame_width, canvas_width), height=max(frame_height, canvas_height))
-
-    def _on_canvas_configure(self, event):
-        """Reset the canvas window to encompass inner frame when required"""
-    def _on_mousewheel(self, event):
-        """Handle mouse wheel scrolling with shift for horizontal scroll"""
-        if event.state & 0x1:  # Shift key pressed
-            # Horizontal scrolling
-            self.grid_canvas.xview_scroll(int(-1 * (event.delta / 120)), "units")
-        else:
-            # Vertical scrolling
-            self.grid_canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
-        canvas_width = event.width
-        frame_width = self.grid_frame.winfo_reqwidth()
-        # Only resize if frame is smaller than canvas
-        if frame_width < canvas_width:
-            self.grid_canvas.itemconfig(self.canvas_frame, width=canvas_width)
-
     def _on_mousewheel(self, event):
         """Handle mouse wheel scrolling"""
         # Check if we need horizontal scroll (Shift key or if vertical scroll isn't needed)
@@ -1845,7 +3710,7 @@ Premium features include:
         
         # Make canvas focusable for keyboard events
         self.grid_canvas.focus_set()
-        self.grid_canvas.bind("<Button-1>", lambda e: self.grid_canvas.focus_set())
+        self.grid_canvas.bind("<Button-1>", lambda e: self.grid_canvas.focus_set(), add='+')
 
     def export_pdf(self):
         # Lazy load reportlab only when needed
@@ -1862,12 +3727,8 @@ Premium features include:
             
         try:
             data = []
-            for (class_, section, day, period), (subj_var, teacher_var) in self.entries.items():
-                if subj_var.get() or teacher_var.get():
-                    data.append([
-                        class_, section, day, str(period + 1), 
-                        subj_var.get() or "", teacher_var.get() or ""
-                    ])
+            for (class_, section, day, period), subject, teacher in self.model.filled():
+                data.append([class_, section, day, str(period + 1), subject, teacher])
             
             if not data:
                 messagebox.showinfo("No Data", "No timetable data to export.")
@@ -1907,98 +3768,283 @@ Premium features include:
             messagebox.showerror("Export Error", f"Failed to export PDF:\n{str(e)}")
             return
 
-        # Grid
-        self.grid_frame = ttk.Frame(self.root)
-        self.grid_frame.pack(fill='both', expand=True, padx=10, pady=10)
-        
-        # Initial grid draw
-        self.draw_grid()
-
     def draw_grid(self):
-        """Optimized grid drawing with batched operations"""
-        # Clear grid efficiently
-        for widget in self.grid_frame.winfo_children():
-            widget.destroy()
-        
-        # Disable updates during grid creation for faster rendering
-        self.grid_frame.update_idletasks()
+        """Reset the timetable model to the current config and redraw the visible cells"""
+        self.model.configure(self.config)
+        self.grid_view.set_choices(self.config['subjects'], self.config['teachers'],
+                                   self.config.get('teacher_subjects'))
+
+    def _on_grid_build_progress(self, done, total):
+        """Show or hide the grid build progress bar in the status bar"""
+        if done is None or done >= total:
+            self.build_progress.place_forget()
+            self.build_cancel_btn.place_forget()
+            return
+        self.build_progress.configure(maximum=total, value=done)
+        self.build_progress.place(relx=1.0, rely=0.5, x=-28, anchor='e')
+        self.build_cancel_btn.place(relx=1.0, rely=0.5, x=-6, anchor='e')
+
+    def _cell_state(self, key):
+        """Highlight state of a cell: 'impacted', 'match', 'resolved' or None"""
+        if key in self.impacted_cells:
+            return 'impacted'
+        if self.search_hits and self.model.index(key) in self.search_hits:
+            return 'match'
+        if key in self.resolved_cells:
+            return 'resolved'
+        return None
+
+    def set_grid_mode(self):
+        """Apply the grid rendering mode chosen in the View menu and remember it"""
+        mode = self.grid_mode.get()
+        self.grid_view.set_mode(mode)
+        self.config['grid_mode'] = mode
+        try:
+            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
+                json.dump(self.config, f, indent=2)
+        except IOError:
+            pass
+
+    def _on_teacher_change(self, key):
+        self.resolved_cells.add(key)
+        self.impacted_cells.discard(key)
+        self.grid_view.repaint([key])
+
+    def refresh_grid(self):
+        # Recompute the scroll region and rebind the visible cells
+        self.grid_view.layout()
+
+    def copy_cells(self):
+        """Copy the selected rectangle of subjects and teachers"""
+        rows = self.grid_view.selected_keys()
+        if not rows:
+            self.status_bar.config(text="Select cells first (click, then Shift-click)")
+            return
+        self._clipboard = [[self.model.get(key) for key in row] for row in rows]
+        self.status_bar.config(text=f"Copied {len(rows)} × {len(rows[0])} cells")
+
+    def paste_cells(self):
+        """Paste the copied block, tiling it across a larger selection"""
+        if not self._clipboard:
+            self.status_bar.config(text="Nothing copied yet")
+            return
+        clip = self._clipboard
+        height, width = len(clip), len(clip[0])
+        rows = self.grid_view.selected_keys(min_rows=height, min_cols=width)
+        self._bulk_edit("Paste", [(key, *clip[r % height][c % width])
+                                  for r, row in enumerate(rows) for c, key in enumerate(row)])
+
+    def fill_cells(self):
+        """Copy the selection's top-left cell into the whole selection"""
+        rows = self.grid_view.selected_keys()
+        if rows:
+            subject, teacher = self.model.get(rows[0][0])
+            self._bulk_edit("Fill", [(key, subject, teacher) for row in rows for key in row])
+
+    def clear_cells(self):
+        rows = self.grid_view.selected_keys()
+        self._bulk_edit("Clear", [(key, '', '') for row in rows for key in row])
+
+    def _bulk_edit(self, label, items):
+        """Apply items as one model update, with one repaint and one undo entry"""
+        if not items:
+            self.status_bar.config(text="Select cells first (click, then Shift-click)")
+            return
+        started = time.perf_counter()
+        before = [(key, *self.model.get(key)) for key, _, _ in items]
+        self.model.assign(items)
+        self._undo_stack.append((label, before))
+        del self._undo_stack[:-self.UNDO_LIMIT]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.status_bar.config(text=f"{label}: {len(items)} cells in {elapsed_ms:.0f} ms (Ctrl+Z to undo)")
+
+    def _swap_problems(self, source, target, teachers_only):
+        """Double-bookings and mapping breaks a swap would cause, without scanning the grid"""
+        model = self.model
+        problems = []
+        for teacher, col in self.timetable_index.clashes_after_swap(model.index(source), model.index(target)):
+            day, period = model.cols[col]
+            problems.append(f"{teacher} is already teaching on {day} P{period + 1}")
+        if teachers_only:
+            # Whole-cell swaps keep every subject with its teacher; teacher-only swaps do not
+            (subject_a, teacher_a), (subject_b, teacher_b) = model.get(source), model.get(target)
+            for subject, teacher in ((subject_a, teacher_b), (subject_b, teacher_a)):
+                if subject and teacher and not self.grid_view.directory.can_teach(teacher, subject):
+                    problems.append(f"{teacher} is not mapped to teach {subject}")
+        return problems
+
+    def _check_swap(self, source, target, teachers_only):
+        problems = self._swap_problems(source, target, teachers_only)
+        what = "teachers" if teachers_only else "periods"
+        where = f"{source[0]}-{source[1]} {source[2]} P{source[3] + 1} ↔ {target[0]}-{target[1]} {target[2]} P{target[3] + 1}"
+        if problems:
+            self.status_bar.config(text=f"❌ Swap {what} {where}: {'; '.join(problems)}")
+        else:
+            self.status_bar.config(text=f"✅ Swap {what} {where}")
+        return not problems
+
+    def _on_swap(self, source, target, teachers_only):
+        """Swap two cells (or just their teachers) as one undoable edit"""
+        problems = self._swap_problems(source, target, teachers_only)
+        if problems and not messagebox.askyesno("Swap Conflicts", "\n".join(problems) + "\n\nSwap anyway?"):
+            self.status_bar.config(text="Swap cancelled")
+            return
+        (subject_a, teacher_a), (subject_b, teacher_b) = self.model.get(source), self.model.get(target)
+        if teachers_only:
+            items = [(source, None, teacher_b), (target, None, teacher_a)]
+        else:
+            items = [(source, subject_b, teacher_b), (target, subject_a, teacher_a)]
+        self._bulk_edit("Swap", items)
+
+    def undo_bulk_edit(self):
+        if not self._undo_stack:
+            self.status_bar.config(text="Nothing to undo")
+            return
+        label, before = self._undo_stack.pop()
+        self.model.assign(before)
+        self.status_bar.config(text=f"Undid {label.lower()} of {len(before)} cells")
+
+    def _on_view_mode_selected(self, event=None):
+        mode = self.view_mode.get()
+        choices = {
+            'Class': self.config['classes'],
+            'Day': self.config['days'],
+            'Teacher': sorted(self.config['teachers'], key=str.casefold),
+        }.get(mode, [])
+        self.view_value_cb.configure(values=choices, state='readonly' if choices else 'disabled')
+        self.view_value.set(choices[0] if choices else '')
+        self.apply_view_filter()
+
+    def apply_view_filter(self):
+        """Show only the rows and columns picked in the View controls"""
+        started = time.perf_counter()
+        mode, value = self.view_mode.get(), self.view_value.get()
+        index = self.timetable_index
+        rows = cols = None
+        if mode == 'Class' and value:
+            rows = index.rows_by_class.get(value, [])
+        elif mode == 'Day' and value:
+            cols = index.cols_by_day.get(value, [])
+        elif mode == 'Teacher' and value:
+            rows, cols = index.teacher_view(value)
+        self.grid_view.set_view(rows, cols)
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        shown = f"{len(self.grid_view.view_rows)} rows × {len(self.grid_view.view_cols)} periods"
+        label = "All classes" if mode == 'All' or not value else f"{mode} {value}"
+        self.status_bar.config(text=f"View: {label} - {shown} in {elapsed_ms:.0f} ms")
+
+    def _on_search_typed(self, event):
+        if event.keysym in ('Return', 'Shift_L', 'Shift_R'):
+            return
+        self.run_search()
+
+    def run_search(self, jump=True):
+        """Highlight every cell matching the search box and optionally jump to the first"""
+        started = time.perf_counter()
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+            self._search_job = None
+        query = self.search_var.get()
+        hits = self.timetable_index.search(query)
+        changed = hits ^ self.search_hits
+        self.search_hits = hits
+        key_at = self.model.key_at
+        self.grid_view.repaint(key_at(index) for index in changed)
+        
+        # Jumps follow on-screen order and skip cells the current view hides
+        grid = self.grid_view
+        positions = ((grid.view_position(key_at(index)), index) for index in hits)
+        self._search_order = [index for pos, index in sorted((p, i) for p, i in positions if p is not None)]
+        self._search_pos = -1
+        
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if not query.strip():
+            self.status_bar.config(text="Ready")
+            return
+        hidden = len(hits) - len(self._search_order)
+        note = f" ({hidden} hidden by view)" if hidden else ""
+        self.status_bar.config(text=f"Search '{query.strip()}': {len(hits)} cells{note} in {elapsed_ms:.1f} ms")
+        if jump and self._search_order:
+            self.jump_to_match(1)
+
+    def jump_to_match(self, step):
+        """Scroll to the next (step=1) or previous (step=-1) search match"""
+        if not self._search_order:
+            return
+        self._search_pos = (self._search_pos + step) % len(self._search_order)
+        key = self.model.key_at(self._search_order[self._search_pos])
+        self.grid_view.see(key)
+        class_, section, day, period = key
+        self.status_bar.config(text=f"Match {self._search_pos + 1} of {len(self._search_order)}: "
+                                    f"{class_}-{section}, {day} P{period + 1}")
+
+    def _on_search_reset(self, changes):
+        # Hits are model indices, which a reshape or load invalidates; _on_search_stale re-runs the search
+        if changes is None:
+            self.search_hits = set()
+            self._search_order = []
+            self._search_pos = -1
+
+    def _on_search_stale(self, changes):
+        # Edits can add or remove matches; re-run once the burst is over
+        if self.search_var.get().strip() and self._search_job is None:
+            self._search_job = self.root.after_idle(lambda: self.run_search(jump=False))
+
+    def search_all_weeks(self):
+        """Count matches in every saved week through the name lookup tables and ID indexes"""
+        query = self.search_var.get().strip()
+        if not query:
+            messagebox.showinfo("Search", "Type a teacher, subject, class or section to search for.")
+            return
+        started = time.perf_counter()
+        self.status_bar.config(text=f"Searching all weeks for '{query}'...")
         
-        # Headers - create in batch
-        header_widgets = []
-        header_widgets.append(ttk.Label(self.grid_frame, text="Class", style='Header.TLabel', borderwidth=1, relief="solid", width=10, anchor='center', justify='center'))
-        header_widgets.append(ttk.Label(self.grid_frame, text="Section", style='Header.TLabel', borderwidth=1, relief="solid", width=8, anchor='center', justify='center'))
+        def query_weeks():
+            return self.store.count_matches(query)
         
-        # Grid headers
-        header_widgets[0].grid(row=0, column=0, sticky='nsew')
-        header_widgets[1].grid(row=0, column=1, sticky='nsew')
+        def show_weeks(weeks, error):
+            if error is not None:
+                self.status_bar.config(text="Search failed")
+                messagebox.showerror("Search Error", f"Failed to search saved weeks:\n{str(error)}")
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.status_bar.config(text=f"'{query}' found in {len(weeks)} saved weeks in {elapsed_ms:.0f} ms")
+            
+            win = tk.Toplevel(self.root)
+            win.title(f"Search All Weeks: {query}")
+            win.geometry("360x400")
+            table = ttk.Treeview(win, columns=('year', 'week', 'cells'), show='headings')
+            for column, title in (('year', "Year"), ('week', "Week"), ('cells', "Matching Cells")):
+                table.heading(column, text=title)
+                table.column(column, width=100, anchor='center')
+            for year, week, count in weeks:
+                table.insert('', 'end', values=(year, week, count))
+            table.pack(fill='both', expand=True, padx=10, pady=10)
+            
+            def open_week(event=None):
+                selection = table.selection()
+                if not selection:
+                    return
+                year, week, _ = table.item(selection[0], 'values')
+                self.selected_year.set(int(year))
+                self.selected_week.set(int(week))
+                win.destroy()
+                self.load_timetable()
+            
+            table.bind('<Double-1>', open_week)
+            ttk.Button(win, text="Open Week", command=open_week).pack(pady=(0, 10))
         
-        col = 2
-        for day in self.config['days']:
-            for p in range(self.config['periods_per_day']):
-                header = ttk.Label(self.grid_frame, text=f"{day}\nP{p+1}", style='Header.TLabel', borderwidth=1, relief="solid", width=10)
-                header.grid(row=0, column=col, sticky='nsew')
-                col += 1
-
-        # Cells
-        row = 1
-        for class_ in self.config['classes']:
-            for section in self.config['sections']:
-                ttk.Label(self.grid_frame, text=class_, style='TLabel', borderwidth=1, relief="solid", width=10, anchor='center', justify='center').grid(row=row, column=0, sticky='nsew')
-                ttk.Label(self.grid_frame, text=section, style='TLabel', borderwidth=1, relief="solid", width=8, anchor='center', justify='center').grid(row=row, column=1, sticky='nsew')
-                col = 2
-                for day in self.config['days']:
-                    for period in range(self.config['periods_per_day']):
-                        cell_key = (class_, section, day, period)
-                        highlight = None
-                        if cell_key in self.impacted_cells:
-                            highlight = 'RedCell.TFrame'
-                        elif cell_key in self.resolved_cells:
-                            highlight = 'GreenCell.TFrame'
-                        else:
-                            highlight = 'FancyCell.TFrame'
-                        frame = ttk.Frame(self.grid_frame, style=highlight)
-                        frame.grid(row=row, column=col, sticky='nsew')
-                        subj_var = tk.StringVar()
-                        teacher_var = tk.StringVar()
-                        subj_cb = ttk.Combobox(frame, textvariable=subj_var, values=self.config['subjects'], width=8, state='readonly')
-                        subj_cb.pack(side='top', fill='x', padx=1, pady=1)
-                        
-                        # Make teacher names editable with dropdown
-                        teacher_cb = ttk.Combobox(frame, textvariable=teacher_var, values=self.config['teachers'], width=12)
-                        teacher_cb.pack(side='top', fill='x', padx=1, pady=(0,2))
-                        
-                        self.entries[cell_key] = (subj_var, teacher_var)
-                        self.teacher_cbs[cell_key] = teacher_cb
-                        self.cell_frames[cell_key] = frame
-                        def on_teacher_change(event=None, key=cell_key):
-                            self.resolved_cells.add(key)
-                            self.impacted_cells.discard(key)
-                            if key in self.cell_frames:
-                                self.cell_frames[key].configure(style='GreenCell.TFrame')
-                        teacher_cb.bind('<FocusOut>', on_teacher_change)
-                        teacher_cb.bind('<Return>', on_teacher_change)
-                        teacher_cb.bind('<<ComboboxSelected>>', on_teacher_change)
-                        col += 1
-                row += 1
+        self._run_in_background(query_weeks, show_weeks)
 
-    def refresh_grid(self):
-        # Update the display and scrollbars
-        self.grid_frame.update_idletasks()
-        self.grid_canvas.configure(scrollregion=self.grid_canvas.bbox("all"))
-        
-        # Ensure proper canvas sizing for scrolling
-        frame_width = self.grid_frame.winfo_reqwidth()
-        frame_height = self.grid_frame.winfo_reqheight()
-        canvas_width = self.grid_canvas.winfo_width()
-        canvas_height = self.grid_canvas.winfo_height()
-        
-        # Configure scrolling based on content size
-        if frame_width > canvas_width or frame_height > canvas_height:
-            self.grid_canvas.itemconfig(self.canvas_frame, 
-                                       width=max(frame_width, canvas_width),
-                                       height=max(frame_height, canvas_height))
-        if frame_height > canvas_height:
-            self.grid_canvas.itemconfig(self.canvas_frame, height=frame_height)
+    def _on_model_reset(self, changes):
+        if changes is not None:
+            return
+        # Undo entries hold cell values of the grid as it was before the reset
+        self._undo_stack.clear()
+        # A reshape or freshly loaded week changes which cells a filter selects
+        if self.view_mode.get() != 'All':
+            self.apply_view_filter()
 
     def mark_leave(self):
         dialog = tk.Toplevel(self.root)
@@ -2062,17 +4108,17 @@ Premium features include:
             
             # Find all periods where this teacher is assigned on this day
             impacted_periods = []
-            for (class_, section, d, period), (subj_var, teacher_var_entry) in self.entries.items():
-                if d == day and teacher_var_entry.get().strip().lower() == teacher.strip().lower():
-                    impacted_periods.append({
-                        'class': class_,
-                        'section': section,
-                        'day': d,
-                        'period': period,
-                        'period_num': period + 1,
-                        'subject': subj_var.get(),
-                        'key': (class_, section, d, period)
-                    })
+            for index in self.timetable_index.teacher_cells_on(teacher, day):
+                class_, section, d, period = key = self.model.key_at(index)
+                impacted_periods.append({
+                    'class': class_,
+                    'section': section,
+                    'day': d,
+                    'period': period,
+                    'period_num': period + 1,
+                    'subject': self.model.get_at(index)[0],
+                    'key': key
+                })
             
             self.current_impacted_periods = impacted_periods
             
@@ -2133,25 +4179,26 @@ Premium features include:
             # Process the leave
             substitute_teacher = substitute if substitute != '[Leave Blank]' else ""
             processed_assignments = []
+            updates = []
             
             for period_info in self.current_impacted_periods:
                 key = period_info['key']
-                if key in self.entries:
-                    subj_var, teacher_var_entry = self.entries[key]
-                    
+                if key in self.model:
                     # Update teacher assignment
                     old_assignment = f"{period_info['class']}-{period_info['section']} P{period_info['period_num']} ({period_info['subject']})"
-                    teacher_var_entry.set(substitute_teacher)
+                    updates.append((key, None, substitute_teacher))
                     
                     # Mark cell as impacted (red color)
                     self.impacted_cells.add(key)
                     self.resolved_cells.discard(key)
-                    if key in self.cell_frames:
-                        self.cell_frames[key].configure(style='RedCell.TFrame')
                     
                     new_teacher_text = substitute_teacher if substitute_teacher else "[UNASSIGNED]"
                     processed_assignments.append(f"{old_assignment} → {new_teacher_text}")
             
+            # One model update and one repaint for every affected period
+            self.model.assign(updates)
+            self.grid_view.repaint(update[0] for update in updates)
+            
             # Show confirmation
             result_message = f"✅ Teacher leave processed successfully!\n\n"
             result_message += f"👨‍🏫 Teacher on Leave: {teacher}\n"
@@ -2189,61 +4236,353 @@ Premium features include:
         dialog.after(100, analyze_and_show_impact)
 
     def save_timetable(self):
+        """Persist the grid on the writer thread, writing only edited cells when possible.
+
+        A delta save needs the grid to still hold the week it was loaded or
+        last saved as; anything else (another week selected, a reshape, a
+        fresh grid, a change of template mode) rewrites the whole week.
+        While a save is being written, further requests collapse into one
+        save that runs when it lands.
+        """
+        if self._save_in_flight:
+            self._save_again = True
+            return
+        
         year = self.selected_year.get()
         week = self.selected_week.get()
+        template = self.template_week.get()
+        started = time.perf_counter()
+        full = self._dirty_all or self._clean_week != (year, week, template)
+        
+        # Snapshot the cells now; the grid is free to change while they are written
+        model = self.model
+        edited = [(model.key_at(i),) + model.get_at(i) for i in self._dirty]
+        cells = list(model.filled()) if full else edited
+        
+        def write(store):
+            if full:
+                result = store.save_week(year, week, cells, template)
+            else:
+                result = store.save_cells(year, week, cells, template)
+            # Journal entries queued after this save stay for the next one
+            store.clear_journal()
+            return result
+        
+        # Buffered journal entries are covered by the snapshot
+        self._journal.clear()
+        self.week_cache.invalidate((year, week))
+        saving = self._dirty
+        self._dirty = set()
+        self._mark_clean(year, week, template)
+        self._save_in_flight = True
+        self.status_bar.config(text=f"Saving Year {year}, Week {week}...")
+        
+        def saved(result, error):
+            self._save_in_flight = False
+            if error is not None:
+                # Nothing was committed; put the edits back and rewrite the whole week next time
+                if self._clean_week == (year, week, template):
+                    self._dirty |= saving
+                    # The journal buffer was emptied for this save; edits made since stay newer.
+                    # Edited cells include the ones cleared; after a reset only the filled grid is known.
+                    for key, subject, teacher in edited if edited else cells:
+                        self._journal.setdefault(key, (subject, teacher))
+                    self._flush_journal()
+                self._dirty_all = True
+                self._save_again = False
+                self._update_save_label()
+                self.status_bar.config(text="Save failed")
+                messagebox.showerror("Save Error", f"Failed to save timetable:\n{str(error)}")
+                return
+            written, removed = result
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            kind = "week" if full else "changes"
+            self.status_bar.config(text=f"Saved {kind} for Year {year}, Week {week}: {written} written, "
+                                        f"{removed} removed in {elapsed_ms:.0f} ms")
+            if self._save_again:
+                self._save_again = False
+                self.save_timetable()
+            else:
+                messagebox.showinfo("Success", "Timetable saved")
         
-        # Clear old data
-        self.c.execute("DELETE FROM timetable WHERE year=? AND week=?", (year, week))
+        self._submit_write(write, saved)
+
+    def _submit_write(self, write, on_done=None):
+        """Queue write(store) on the writer thread; on_done(result, error) runs here when it lands"""
+        self.writer.submit(write, on_done)
+        if self._writer_poll_job is None:
+            self._writer_poll_job = self.root.after(15, self._poll_writer)
+
+    def _write_now(self, write):
+        """Run write(store) here and return its result, after every queued write has landed.
+
+        For dialog actions that need the result straight away; waiting keeps
+        them ordered after saves queued before them.
+        """
+        self.writer.wait_idle()
+        return write(self.store)
+
+    def _poll_writer(self):
+        self._writer_poll_job = None
+        if self.writer.poll() and self._writer_poll_job is None:
+            self._writer_poll_job = self.root.after(15, self._poll_writer)
+
+    def _mark_clean(self, year, week, template):
+        """Record that the grid now matches the stored copy of a week"""
+        self._dirty.clear()
+        self._dirty_all = False
+        self._clean_week = (year, week, template)
+        self._update_save_label()
+
+    def _on_cells_edited(self, changes):
+        if changes is None:
+            # Axes or every cell were replaced, so cell indices no longer line up
+            self._dirty.clear()
+            self._dirty_all = True
+        else:
+            self._dirty.update(index for index, _, _ in changes)
+            model = self.model
+            for index, _, _ in changes:
+                self._journal[model.key_at(index)] = model.get_at(index)
+            if self._journal_job is None:
+                self._journal_job = self.root.after(self.JOURNAL_INTERVAL_MS, self._flush_journal)
+        if self._save_label_job is None:
+            self._save_label_job = self.root.after_idle(self._update_save_label)
+
+    def _flush_journal(self):
+        """Group-commit buffered edits to the journal on the writer thread"""
+        if self._journal_job is not None:
+            self.root.after_cancel(self._journal_job)
+            self._journal_job = None
+        if not self._journal:
+            return
+        if self._clean_week:
+            year, week = self._clean_week[:2]
+        else:
+            year, week = self.selected_year.get(), self.selected_week.get()
+        cells = [(key,) + value for key, value in self._journal.items()]
+        self._journal = {}
         
-        # Save current grid
-        for (class_, section, day, period), (subj_var, teacher_var) in self.entries.items():
-            if subj_var.get() and teacher_var.get():  # Only save filled cells
-                self.c.execute('''
-                    INSERT INTO timetable (year, week, class, section, day, period, subject, teacher)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (year, week, class_, section, day, period, subj_var.get(), teacher_var.get()))
-                
-        self.conn.commit()
-        messagebox.showinfo("Success", "Timetable saved")
+        def journaled(result, error):
+            if error is not None:
+                print(f"Journal error: {error}")
+        
+        self._submit_write(lambda store: store.append_journal(year, week, cells), journaled)
+
+    def restore_journal(self):
+        """Offer to replay edits journaled before the last crash or close, then load the week"""
+        try:
+            entries = self.store.journal()
+        except sqlite3.Error as e:
+            print(f"Journal read error: {e}")
+            entries = []
+        if entries:
+            year, week = entries[-1][:2]
+            edits = [(key, subject, teacher) for y, w, key, subject, teacher in entries if (y, w) == (year, week)]
+            if messagebox.askyesno("Restore Unsaved Edits",
+                                   f"{len(edits)} unsaved edits to Year {year}, Week {week} were found.\n\n"
+                                   "Restore them?"):
+                self.selected_year.set(year)
+                self.selected_week.set(week)
+                self.load_timetable(replay=edits)
+                return
+        self.load_timetable()
+
+    def _update_save_label(self):
+        self._save_label_job = None
+        count = len(self._dirty)
+        self.save_button.config(text=f"💾 SAVE TIMETABLE ({count})" if count else "💾 SAVE TIMETABLE")
 
-    def load_timetable(self):
+    def save_as_template(self):
+        """Make the grid the base template that template weeks are stored against"""
+        if not messagebox.askyesno("Save as Template",
+                                   "Replace the base template with the current grid?\n"
+                                   "Template weeks without their own changes will follow it."):
+            return
+        try:
+            count = self._write_now(lambda store: store.save_template(self.model.filled()))
+            # Template weeks read through to the template
+            self.week_cache.invalidate()
+        except sqlite3.Error as e:
+            messagebox.showerror("Save Error", f"Failed to save template:\n{str(e)}")
+            return
+        self.status_bar.config(text=f"Template saved: {count} cells")
+
+    def new_week_from_template(self):
+        """Start the selected week as a copy of the template and load it"""
         year = self.selected_year.get()
         week = self.selected_week.get()
-        
-        # Ensure grid is drawn first
-        if not hasattr(self, 'entries') or not self.entries:
-            self.draw_grid()
-        
-        # Clear grid
-        for _, (subj_var, teacher_var) in self.entries.items():
-            subj_var.set('')
-            teacher_var.set('')
-            
-        # Load saved data
         try:
-            self.c.execute('''
-                SELECT class, section, day, period, subject, teacher 
-                FROM timetable 
-                WHERE year=? AND week=?
-            ''', (year, week))
-            
-            rows_loaded = 0
-            for row in self.c.fetchall():
-                class_, section, day, period, subject, teacher = row
-                key = (class_, section, day, period)
-                if key in self.entries:
-                    self.entries[key][0].set(subject or '')
-                    self.entries[key][1].set(teacher or '')
-                    rows_loaded += 1
-            
+            created = self._write_now(lambda store: store.create_week_from_template(year, week))
+            self.week_cache.invalidate((year, week))
+        except sqlite3.Error as e:
+            messagebox.showerror("Save Error", f"Failed to create week:\n{str(e)}")
+            return
+        if not created:
+            messagebox.showwarning("Week Exists", f"Year {year}, Week {week} already has a saved timetable.")
+            return
+        self.load_timetable()
+
+    def roll_forward(self):
+        """Copy the saved copy of the selected week to a range of later weeks"""
+        year = self.selected_year.get()
+        week = self.selected_week.get()
+        last_week = datetime(year, 12, 28).isocalendar()[1]
+        if week >= last_week:
+            messagebox.showinfo("Roll Forward", f"Week {week} is the last week of {year}.")
+            return
+        
+        win = tk.Toplevel(self.root)
+        win.title("Roll Forward")
+        win.geometry("360x170")
+        
+        form = ttk.Frame(win, padding=15)
+        form.pack(fill='both', expand=True)
+        through_var = tk.IntVar(value=last_week)
+        skip_var = tk.BooleanVar(value=True)
+        ttk.Label(form, text=f"Copy saved Week {week} of {year} to weeks {week + 1} through:").grid(
+            row=0, column=0, columnspan=2, sticky='w', pady=5)
+        ttk.Spinbox(form, from_=week + 1, to=last_week, textvariable=through_var, width=6).grid(
+            row=1, column=0, sticky='w', pady=5)
+        ttk.Checkbutton(form, text="Skip weeks that already have data", variable=skip_var).grid(
+            row=2, column=0, columnspan=2, sticky='w', pady=5)
+        
+        def apply_roll():
+            try:
+                through = min(through_var.get(), last_week)
+            except tk.TclError:
+                return
+            targets = [(year, target) for target in range(week + 1, through + 1)]
+            started = time.perf_counter()
+            try:
+                result = self._write_now(lambda store: store.roll_forward(year, week, targets, skip_var.get()))
+                self.week_cache.invalidate()
+            except sqlite3.Error as e:
+                messagebox.showerror("Roll Forward Error", f"Failed to copy week:\n{str(e)}")
+                return
+            if result is None:
+                messagebox.showwarning("Roll Forward", f"Year {year}, Week {week} has not been saved yet.")
+                return
+            win.destroy()
+            copied, skipped = result
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.status_bar.config(text=f"Rolled Week {week} forward to {copied} weeks "
+                                        f"({skipped} skipped) in {elapsed_ms:.0f} ms")
+        
+        buttons = ttk.Frame(win)
+        buttons.pack(fill='x', padx=15, pady=(0, 10))
+        ttk.Button(buttons, text="Copy", command=apply_roll).pack(side='right', padx=5)
+        ttk.Button(buttons, text="Cancel", command=win.destroy).pack(side='right', padx=5)
+        win.grab_set()
+
+    def load_timetable(self, replay=None):
+        """Load the selected week off the UI thread and swap it into the grid in one repaint.
+
+        Loading discards the journal of unsaved edits; replay, a list of
+        (key, subject, teacher) edits, is applied on top of the loaded week
+        and journaled again.
+        """
+        year = self.selected_year.get()
+        week = self.selected_week.get()
+        started = time.perf_counter()
+        
+        # A newer load supersedes any that is still running
+        self._load_generation += 1
+        generation = self._load_generation
+        rows, cols = self.model.rows, self.model.cols
+        cache = self.week_cache
+        cached = cache.get((year, week), rows, cols)
+        self.status_bar.config(text=f"Loading Year {year}, Week {week}...")
+        
+        def fetch_and_decode():
+            version = cache.version
+            # Read after any queued save of this week has committed
+            self.writer.wait_idle()
+            template, records = self.store.fetch_week(year, week)
+            state = WeekState(rows, cols, records, template)
+            cache.put((year, week), state.copy(), version)
+            return state
+        
+        def apply_week(state, error):
+            if generation != self._load_generation:
+                return
+            if error is not None:
+                self.status_bar.config(text="Load failed")
+                messagebox.showerror("Load Error", f"Failed to load timetable:\n{str(error)}")
+                print(f"Load error: {error}")
+                return
+            if not self.model.replace(state):
+                # Classes or sections changed while decoding; decode again
+                self.load_timetable(replay)
+                return
+            self.template_week.set(state.template)
+            self._mark_clean(year, week, state.template)
+            self._journal.clear()
+            self._submit_write(lambda store: store.clear_journal())
+            if replay:
+                self.model.assign(replay)
+                self._flush_journal()
+            self._prefetch_neighbours(year, week)
+            self.root.after_idle(lambda: report_ready(state.count))
+        
+        def report_ready(rows_loaded):
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            # Reported in the status bar only, so flipping between weeks never waits on a dialog
             if rows_loaded > 0:
-                messagebox.showinfo("Success", f"Loaded timetable for Year {year}, Week {week}\n{rows_loaded} entries loaded.")
+                source = "cached" if cached is not None else "loaded"
+                summary = f"{rows_loaded} entries {source}"
             else:
-                messagebox.showinfo("No Data", f"No saved timetable found for Year {year}, Week {week}")
-                
-        except Exception as e:
-            messagebox.showerror("Load Error", f"Failed to load timetable:\n{str(e)}")
-            print(f"Load error: {e}")
+                summary = "no saved timetable"
+            self.status_bar.config(text=f"Year {year}, Week {week}: {summary}, ready in {elapsed_ms:.0f} ms "
+                                        f"(cache: {cache.hits} hits, {cache.misses} misses)")
+        
+        if cached is not None:
+            apply_week(cached, None)
+        else:
+            self._run_in_background(fetch_and_decode, apply_week)
+
+    def _prefetch_neighbours(self, year, week):
+        """Decode the weeks either side of a loaded week into the cache in the background"""
+        cache = self.week_cache
+        rows, cols = self.model.rows, self.model.cols
+        last_week = datetime(year, 12, 28).isocalendar()[1]
+        keys = [(year, w) for w in (week + 1, week - 1) if 1 <= w <= last_week and (year, w) not in cache]
+        if not keys:
+            return
+        
+        def prefetch():
+            version = cache.version
+            self.writer.wait_idle()
+            for key in keys:
+                template, records = self.store.fetch_week(*key)
+                cache.put(key, WeekState(rows, cols, records, template), version)
+        
+        def prefetched(result, error):
+            if error is not None:
+                print(f"Prefetch error: {error}")
+        
+        self._run_in_background(prefetch, prefetched)
+
+    def _run_in_background(self, work, on_done):
+        """Run work() on a worker thread and pass (result, error) to on_done on the Tk thread"""
+        outcome = {}
+        
+        def runner():
+            try:
+                outcome['result'] = work()
+            except Exception as e:
+                outcome['error'] = e
+        
+        worker = threading.Thread(target=runner, daemon=True)
+        worker.start()
+        
+        def poll():
+            if worker.is_alive():
+                self.root.after(15, poll)
+            else:
+                on_done(outcome.get('result'), outcome.get('error'))
+        
+        self.root.after(15, poll)
 
     def edit_restrictions(self):
         """Open the teacher restrictions management dialog"""
@@ -2449,10 +4788,7 @@ Premium features include:
         filled_count = 0
         total_cells = len(self.config['classes']) * len(self.config['sections']) * len(self.config['days']) * self.config['periods_per_day']
         
-        # Ensure entries exist first
-        if not hasattr(self, 'entries') or not self.entries:
-            self.draw_grid()
-            
+        assignments = []
         for day in self.config['days']:
             for period in range(self.config['periods_per_day']):
                 used_teachers = set()
@@ -2460,12 +4796,9 @@ Premium features include:
                 for idx_class, class_ in enumerate(self.config['classes']):
                     for idx_section, section in enumerate(self.config['sections']):
                         key = (class_, section, day, period)
-                        if key in self.entries:
-                            subj_var, teacher_var = self.entries[key]
-                            
+                        if key in self.model:
                             # Assign subject in a round-robin way
                             subject = subjects[(period + idx_class + idx_section) % len(subjects)]
-                            subj_var.set(subject)
                             
                             # Find available teacher for this subject not already used in this period
                             available_teachers = [t for t in all_teachers if subject in teacher_subjects.get(t, []) and t not in used_teachers]
@@ -2483,15 +4816,14 @@ Premium features include:
                                 # Use first available teacher
                                 assigned_teacher = available_teachers[0]
                             
-                            teacher_var.set(assigned_teacher)
+                            assignments.append((key, subject, assigned_teacher))
                             if assigned_teacher:
                                 used_teachers.add(assigned_teacher)
                             filled_count += 1
                             class_section_index += 1
         
-        # Update the display
-        self.grid_frame.update_idletasks()
-        self.grid_canvas.configure(scrollregion=self.grid_canvas.bbox("all"))
+        # Apply the whole week as one model update
+        self.model.assign(assignments)
         messagebox.showinfo("Success", f"Auto-assign completed!\nFilled {filled_count} out of {total_cells} timetable slots")
 
     def smart_match(self):
@@ -2509,30 +4841,26 @@ Premium features include:
             return
         
         # Validate that no teacher is assigned to more than one subject at the same time (case-insensitive)
-        periods = self.config['periods_per_day']
-        days = self.config['days']
-        classes = self.config['classes']
-        sections = self.config['sections']
+        # Only cells that hold a teacher are visited, grouped per teacher by the index
+        model = self.model
+        ncols = model.ncols
+        subject_names = model.subjects.names
+        clashes = []
+        for teacher, cells in self.timetable_index.teachers():
+            by_col = {}
+            for index in cells:
+                by_col.setdefault(index % ncols, []).append(index)
+            for col, indices in by_col.items():
+                if len(indices) > 1:
+                    clashes.append((col, teacher, sorted(indices)))
         conflicts = []
-        for day in days:
-            for period in range(periods):
-                teacher_slots = {}
-                for class_ in classes:
-                    for section in sections:
-                        key = (class_, section, day, period)
-                        if key in self.entries:
-                            subj_var, teacher_var = self.entries[key]
-                            teacher = teacher_var.get().strip().lower()
-                            subject = subj_var.get().strip()
-                            if teacher:
-                                if teacher not in teacher_slots:
-                                    teacher_slots[teacher] = []
-                                teacher_slots[teacher].append((class_, section, subject))
-                for teacher, slots in teacher_slots.items():
-                    if len(slots) > 1:
-                        conflict_str = f"Teacher '{teacher}' assigned to multiple subjects on {day} Period {period+1}: "
-                        conflict_str += ", ".join([f"{c} {s} ({subj})" for c, s, subj in slots])
-                        conflicts.append(conflict_str)
+        for col, teacher, indices in sorted(clashes):
+            day, period = model.cols[col]
+            conflict_str = f"Teacher '{teacher}' assigned to multiple subjects on {day} Period {period+1}: "
+            conflict_str += ", ".join(
+                f"{c} {s} ({subject_names[model.subject_ids[i]].strip()})"
+                for i in indices for c, s in [model.rows[i // ncols]])
+            conflicts.append(conflict_str)
         if conflicts:
             messagebox.showerror("Smart Match - Conflicts Found", "\n".join(conflicts))
         else:
@@ -2551,10 +4879,35 @@ Premium features include:
         current = ', '.join(self.config[key])
         result = simpledialog.askstring('Edit', prompt, initialvalue=current)
         if result is not None:
+            started = time.perf_counter()
             self.config[key] = [x.strip() for x in result.split(',') if x.strip()]
             with open(CONFIG_FILE, 'w') as f:
                 json.dump(self.config, f, indent=2)
-            self.draw_grid()
+            diff = self.apply_config()
+            
+            changes = []
+            if diff['rows_added'] or diff['rows_removed']:
+                changes.append(f"+{len(diff['rows_added'])}/-{len(diff['rows_removed'])} rows")
+            if diff['cols_added'] or diff['cols_removed']:
+                changes.append(f"+{len(diff['cols_added'])}/-{len(diff['cols_removed'])} columns")
+            if not changes:
+                changes.append("dropdowns updated")
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.status_bar.config(text=f"Updated {key}: {', '.join(changes)} in {elapsed_ms:.0f} ms")
+
+    def apply_config(self):
+        """Bring the model and grid in line with self.config without rebuilding them.
+
+        Cells whose class, section, day and period still exist keep their
+        values, including unsaved edits. Returns the model's structural diff.
+        """
+        diff = self.model.reshape(self.config)
+        self.grid_view.set_choices(self.config['subjects'], self.config['teachers'],
+                                   self.config.get('teacher_subjects'))
+        if diff['rows_removed'] or diff['cols_removed']:
+            self.impacted_cells = {key for key in self.impacted_cells if key in self.model}
+            self.resolved_cells = {key for key in self.resolved_cells if key in self.model}
+        return diff
 
     def export_excel(self):
         # Lazy load pandas only when needed
@@ -2593,10 +4946,8 @@ Premium features include:
                         for day in days:
                             for period_idx in range(self.config['periods_per_day']):
                                 key = (class_, section, day, period_idx)
-                                if key in self.entries:
-                                    subj_var, teacher_var = self.entries[key]
-                                    subject = subj_var.get() or ""
-                                    teacher = teacher_var.get() or ""
+                                if key in self.model:
+                                    subject, teacher = self.model.get(key)
                                     entry = f"{section}: {subject}"
                                     if teacher:
                                         entry += f" ({teacher})"
@@ -2646,6 +4997,114 @@ Premium features include:
             messagebox.showerror("Export Error", f"Failed to export Excel:\n{str(e)}")
             return
 
+    def show_teacher_week(self, teacher=None):
+        """Show one teacher's week as a day × period table, kept live as cells are edited"""
+        win = tk.Toplevel(self.root)
+        win.title("Teacher Week")
+        win.geometry("760x360")
+        
+        top = ttk.Frame(win)
+        top.pack(fill='x', padx=10, pady=10)
+        ttk.Label(top, text="Teacher:", font=("Segoe UI", 10, "bold")).pack(side='left')
+        teacher_var = tk.StringVar(value=teacher or (self.config['teachers'][0] if self.config['teachers'] else ''))
+        teacher_cb = ttk.Combobox(top, textvariable=teacher_var, state='readonly', width=25,
+                                  values=sorted(self.config['teachers'], key=str.casefold))
+        teacher_cb.pack(side='left', padx=5)
+        summary = ttk.Label(top, text="")
+        summary.pack(side='left', padx=10)
+        
+        periods = self.config['periods_per_day']
+        columns = ['day'] + [f"p{p}" for p in range(periods)]
+        table = ttk.Treeview(win, columns=columns, show='headings', height=len(self.config['days']))
+        table.heading('day', text="Day")
+        table.column('day', width=90, anchor='w')
+        for p in range(periods):
+            table.heading(f"p{p}", text=f"P{p+1}")
+            table.column(f"p{p}", width=110, anchor='center')
+        table.pack(fill='both', expand=True, padx=10)
+        
+        def show(changes=None):
+            name = teacher_var.get()
+            slots = {}
+            schedule = self.timetable_index.teacher_schedule(name) if name else []
+            for day, period, class_, section, subject in schedule:
+                slots.setdefault((day, period), []).append(f"{class_}-{section} {subject}".strip())
+            table.delete(*table.get_children())
+            for day in self.config['days']:
+                # Two entries in one slot is a clash and shows both
+                cells = [" / ".join(slots.get((day, p), [])) for p in range(periods)]
+                table.insert('', 'end', values=[day] + cells)
+            summary.config(text=f"{len(schedule)} periods this week")
+        
+        def show_in_grid():
+            self.view_mode.set('Teacher')
+            self._on_view_mode_selected()
+            self.view_value.set(teacher_var.get())
+            self.apply_view_filter()
+        
+        def close():
+            self.model.remove_listener(show)
+            win.destroy()
+        
+        teacher_cb.bind('<<ComboboxSelected>>', lambda e: show())
+        buttons = ttk.Frame(win)
+        buttons.pack(fill='x', padx=10, pady=10)
+        ttk.Button(buttons, text="Close", command=close).pack(side='right', padx=5)
+        ttk.Button(buttons, text="Show in Grid", command=show_in_grid).pack(side='right', padx=5)
+        win.protocol("WM_DELETE_WINDOW", close)
+        
+        # The index is already current when listeners run, so refreshing costs only this teacher's periods
+        self.model.add_listener(show)
+        show()
+
+    def rename_teacher(self):
+        """Rename a teacher in the config, the grid and every saved week at once"""
+        win = tk.Toplevel(self.root)
+        win.title("Rename Teacher")
+        win.geometry("360x170")
+        
+        form = ttk.Frame(win, padding=15)
+        form.pack(fill='both', expand=True)
+        old_var = tk.StringVar()
+        new_var = tk.StringVar()
+        ttk.Label(form, text="Teacher:").grid(row=0, column=0, sticky='w', pady=5)
+        ttk.Combobox(form, textvariable=old_var, state='readonly', width=25,
+                     values=sorted(self.config['teachers'], key=str.casefold)).grid(row=0, column=1, pady=5)
+        ttk.Label(form, text="New name:").grid(row=1, column=0, sticky='w', pady=5)
+        ttk.Entry(form, textvariable=new_var, width=27).grid(row=1, column=1, pady=5)
+        
+        def apply_rename():
+            old, new = old_var.get(), new_var.get().strip()
+            if not old or not new or new == old:
+                return
+            try:
+                self._write_now(lambda store: store.rename_teacher(old, new))
+                self.week_cache.invalidate()
+            except sqlite3.Error as e:
+                messagebox.showerror("Rename Error", f"Failed to rename teacher:\n{str(e)}")
+                return
+            
+            self.config['teachers'] = list(dict.fromkeys(new if t == old else t for t in self.config['teachers']))
+            mapping = self.config.get('teacher_subjects', {})
+            if old in mapping:
+                subjects = mapping.pop(old)
+                mapping[new] = list(dict.fromkeys(mapping.get(new, []) + subjects))
+            with open(CONFIG_FILE, 'w') as f:
+                json.dump(self.config, f, indent=2)
+            self.apply_config()
+            
+            model = self.model
+            cells = [i for i in self.timetable_index.teacher_cells(old) if model.get_at(i)[1] == old]
+            model.assign([(model.key_at(i), None, new) for i in cells])
+            win.destroy()
+            self.status_bar.config(text=f"Renamed {old} to {new} ({len(cells)} cells in this week)")
+        
+        buttons = ttk.Frame(win)
+        buttons.pack(fill='x', padx=15, pady=(0, 10))
+        ttk.Button(buttons, text="Rename", command=apply_rename).pack(side='right', padx=5)
+        ttk.Button(buttons, text="Cancel", command=win.destroy).pack(side='right', padx=5)
+        win.grab_set()
+
     def show_teacher_subject_mapping(self):
         # Show a dialog to edit teacher-subject mapping
         mapping = self.config.get('teacher_subjects', {})
@@ -2713,6 +5172,7 @@ Premium features include:
             self.config['teacher_subjects'] = mapping
             with open(CONFIG_FILE, 'w') as f:
                 json.dump(self.config, f, indent=2)
+            self.grid_view.set_choices(self.config['subjects'], self.config['teachers'], mapping)
             win.destroy()
             messagebox.showinfo("Success", "Teacher-subject mapping saved successfully!")
         
@@ -2733,101 +5193,6 @@ Premium features include:
         win.focus_set()
         win.grab_set()  # Make window modal
     
-    def save_timetable_entry(self, class_name, section, period, day, teacher, subject):
-        """Save a timetable entry to the database"""
-        try:
-            if not hasattr(self, 'cursor') or not self.cursor:
-                self.setup_db()
-            
-            # Get current week and year
-            week = self.selected_week.get()
-            year = self.selected_year.get()
-            
-            # Check if entry already exists
-            self.cursor.execute("""
-                SELECT id FROM timetable_entries 
-                WHERE class_name=? AND section=? AND period=? AND day=? AND week=? AND year=?
-            """, (class_name, section, period, day, week, year))
-            
-            if self.cursor.fetchone():
-                # Update existing entry
-                self.cursor.execute("""
-                    UPDATE timetable_entries 
-                    SET teacher=?, subject=? 
-                    WHERE class_name=? AND section=? AND period=? AND day=? AND week=? AND year=?
-                """, (teacher, subject, class_name, section, period, day, week, year))
-            else:
-                # Insert new entry
-                self.cursor.execute("""
-                    INSERT INTO timetable_entries 
-                    (class_name, section, period, day, week, year, teacher, subject)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (class_name, section, period, day, week, year, teacher, subject))
-            
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error saving timetable entry: {e}")
-            return False
-    
-    def auto_assign_timetable(self):
-        """Auto-assign teachers to timetable slots"""
-        try:
-            if not self.license_manager.validate_feature("auto_assign"):
-                messagebox.showwarning("Feature Restricted", 
-                    "Auto-assign is not available in your current license. Please upgrade to access this feature.")
-                return
-            
-            # Update status
-            if hasattr(self, 'status_bar'):
-                self.status_bar.config(text="Auto-assigning timetable...")
-            
-            # Simple auto-assignment logic
-            teachers = self.config.get('teachers', [])
-            subjects = self.config.get('subjects', [])
-            
-            if not teachers or not subjects:
-                messagebox.showwarning("Configuration Missing", 
-                    "Please configure teachers and subjects before auto-assignment.")
-                return
-            
-            assigned_count = 0
-            
-            # Get all empty slots
-            for class_name in self.config.get('classes', []):
-                for section in self.config.get('sections', []):
-                    for period in range(1, 9):  # 8 periods
-                        for day in ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']:
-                            # Check if slot is empty
-                            entry_key = (class_name, section, period, day)
-                            if entry_key not in self.entries or not self.entries[entry_key].get():
-                                # Assign random teacher and subject
-                                import random
-                                teacher = random.choice(teachers)
-                                subject = random.choice(subjects)
-                                
-                                # Save the assignment
-                                if self.save_timetable_entry(class_name, section, period, day, teacher, subject):
-                                    if entry_key in self.entries:
-                                        self.entries[entry_key].set(f"{teacher} - {subject}")
-                                    assigned_count += 1
-            
-            # Update status
-            if hasattr(self, 'status_bar'):
-                self.status_bar.config(text=f"Auto-assignment complete: {assigned_count} slots assigned")
-            
-            messagebox.showinfo("Auto-Assignment Complete", 
-                f"Successfully assigned {assigned_count} timetable slots.")
-            
-            return assigned_count
-            
-        except Exception as e:
-            print(f"Error in auto-assignment: {e}")
-            if hasattr(self, 'status_bar'):
-                self.status_bar.config(text="Auto-assignment failed")
-            messagebox.showerror("Error", f"Auto-assignment failed: {str(e)}")
-            return 0
-    
     def update_datetime(self):
         """Update the date and time display every minute"""
         if self.datetime_label: